@@ -11,7 +11,7 @@ from urllib.parse import quote
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
-from app.utils.supabase import get_supabase
+from app.utils.supabase import get_supabase, decode_jwt_claims, SUPABASE_URL
 from app.utils.usage import get_usage_status, FREE_DAILY_LIMIT
 
 logger = logging.getLogger(__name__)
@@ -135,7 +135,7 @@ async def login(req: LoginRequest):
 @router.get("/google", response_model=GoogleAuthResponse)
 async def google_auth(_: Request):
     try:
-        supabase_url = os.environ.get("SUPABASE_URL", "").strip()
+        supabase_url = SUPABASE_URL
         redirect_to = os.environ.get("AUTH_REDIRECT_URL", "http://localhost:8000/web/callback.html").strip()
 
         if not supabase_url:
@@ -173,7 +173,7 @@ async def me(request: Request):
         _upsert_profile(user_id, user_email)
 
         # Get usage status from usage.py
-        usage = get_usage_status(user_id)
+        usage = await get_usage_status(user_id, claims=decode_jwt_claims(token))
 
         # Determine plan
         is_pro = usage.get("is_paid", False)
@@ -1,5 +1,6 @@
 """Foundational Tier 1 endpoints: git integration, auto drafts, engagement tracking, and feedback loop."""
 
+import asyncio
 import json
 import logging
 import os
@@ -8,6 +9,7 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 
+import anyio
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
@@ -22,6 +24,8 @@ DATA_DIR = Path(__file__).parent.parent.parent / "data"
 STATE_PATH = DATA_DIR / "git_autodraft_state.json"
 ENGAGEMENT_PATH = DATA_DIR / "engagement_events.jsonl"
 FEEDBACK_PATH = DATA_DIR / "draft_feedback.jsonl"
+# Serializes read-modify-write of STATE_PATH between concurrent auto-drafts (per worker)
+_STATE_LOCK = asyncio.Lock()
 
 
 class GitCommit(BaseModel):
@@ -107,17 +111,18 @@ def get_git_commits(limit: int = 10):
 
 
 @router.post("/git/auto-draft", response_model=AutoDraftResponse)
-def auto_trigger_draft(request: Request):
-    user_id = _get_user_id_from_request(request)
+async def auto_trigger_draft(request: Request):
+    # Token check, git subprocess and state file I/O block: keep them off the event loop
+    user_id = await anyio.to_thread.run_sync(_get_user_id_from_request, request)
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    commits = _run_git_log(limit=1)
+    commits = await anyio.to_thread.run_sync(_run_git_log, 1)
     if not commits:
         return AutoDraftResponse(triggered=False, reason="No commits found")
 
     latest = commits[0]
-    state = _read_state()
+    state = await anyio.to_thread.run_sync(_read_state)
     last_seen = state.get(user_id)
     if last_seen == latest.hash:
         return AutoDraftResponse(triggered=False, reason="No new commit since last auto-draft", commit=latest)
@@ -128,14 +133,17 @@ def auto_trigger_draft(request: Request):
         "current_mood": "focused",
         "optional_angle": "share progress update",
     }
-    prompt = gen.build_prompt(mode, context)
+    prompt = await anyio.to_thread.run_sync(gen.build_prompt, mode, context)
 
-    options = []
-    for _ in range(2):
-        options.append(gen.generate_human_post(prompt, mode).strip())
+    # Both drafts are generated concurrently with the async Gemini client
+    drafts = await asyncio.gather(*(gen.agenerate_human_post(prompt, mode, t) for t in (0.7, 0.65)))
+    options = [d.strip() for d in drafts]
 
-    state[user_id] = latest.hash
-    _write_state(state)
+    # Re-read under the lock: other users' auto-drafts may have saved state meanwhile
+    async with _STATE_LOCK:
+        state = await anyio.to_thread.run_sync(_read_state)
+        state[user_id] = latest.hash
+        await anyio.to_thread.run_sync(_write_state, state)
 
     return AutoDraftResponse(
         triggered=True,
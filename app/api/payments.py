@@ -19,6 +19,17 @@ router = APIRouter(prefix="/api/payments", tags=["payments"])
 LEMONSQUEEZY_WEBHOOK_SECRET = os.environ.get("LEMONSQUEEZY_WEBHOOK_SECRET", "")
 
 
+def _set_sub_status_claim(admin, user_id: str, status: str) -> None:
+    """
+    Mirror subscription status into app_metadata so new access tokens carry it
+    (lets the paywall skip the subscriptions lookup for paid users).
+    """
+    try:
+        admin.auth.admin.update_user_by_id(user_id, {"app_metadata": {"sub_status": status}})
+    except Exception as e:
+        logger.warning(f"Failed to set sub_status claim for user {user_id}: {e}")
+
+
 def verify_webhook_signature(payload: bytes, signature: str) -> bool:
     """Verify LemonSqueezy webhook signature."""
     if not LEMONSQUEEZY_WEBHOOK_SECRET:
@@ -101,6 +112,7 @@ async def handle_subscription_active(data: dict):
             on_conflict="user_id",
         ).execute()
         
+        _set_sub_status_claim(admin, user_id, "active")
         logger.info(f"Activated subscription for user {user_id}")
         
     except Exception as e:
@@ -130,6 +142,7 @@ async def handle_subscription_inactive(data: dict):
                 }
             ).eq("user_id", user_id).execute()
             
+            _set_sub_status_claim(admin, user_id, "inactive")
             logger.info(f"Deactivated subscription for user {user_id}")
             
     except Exception as e:
@@ -194,9 +207,9 @@ async def get_subscription_status(request: Request):
             }
         
         user_id = result.user.id
-        usage = get_usage_status(user_id)
-        subscription = get_user_subscription(user_id)
-        is_paid = is_user_paid(user_id)
+        usage = await get_usage_status(user_id)
+        subscription = await get_user_subscription(user_id)
+        is_paid = await is_user_paid(user_id)
         
         return {
             "authenticated": True,
@@ -251,7 +264,7 @@ async def cancel_subscription(request: Request):
             raise HTTPException(status_code=401, detail="Invalid token")
         
         user_id = result.user.id
-        subscription = get_user_subscription(user_id)
+        subscription = await get_user_subscription(user_id)
         
         if not subscription or subscription.get("status") != "active":
             raise HTTPException(status_code=400, detail="No active subscription found")
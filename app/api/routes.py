@@ -3,58 +3,97 @@ API routes module - HTTP endpoints for the Banger application.
 """
 
 import os
+import re
 import time
 import asyncio
 import logging
 import traceback
-from typing import List, Optional
+from typing import Annotated, AsyncIterator, Dict, List, Literal, Optional, Tuple
 from datetime import datetime, timezone
 
 import anyio
+import orjson
 import requests
-from fastapi import APIRouter, HTTPException, Response, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, StringConstraints
 
 from app.core.x_client import (
     post_to_x,
     _tweet_url,
     build_intent_url,
-    remaining_posts_this_month,
+    cached_remaining_posts,
+    invalidate_remaining_posts_cache,
+    peek_remaining_posts,
     record_post_to_ledger,
     extract_tweet_id_from_url,
 )
 from app.core import generator as gen
-from app.utils.email import send_email
-from app.utils.supabase import get_supabase
-from app.utils.cache import get_cached_options, set_cached_options, append_perf, read_perf_entries
-from app.utils.usage import can_generate, increment_usage, get_usage_status
+from app.utils.email import send_email, TO_EMAIL
+from app.utils.supabase import get_supabase, decode_jwt_claims, SUPABASE_URL, SUPABASE_ANON_KEY
+from app.utils.cache import (
+    get_cached_options,
+    get_cached_options_with_json,
+    set_cached_options,
+    append_perf,
+    read_perf_entries,
+    normalize_cache_key,
+)
+from app.utils.usage import can_generate, increment_usage, get_usage_status, FREE_DAILY_LIMIT
 
 logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(prefix="/api", tags=["api"])
+# WebSocket endpoints live outside the /api prefix
+ws_router = APIRouter(tags=["ws"])
 
+# Options returned per /api/generate (bump to 3 later), and the starting temperature
+# of each concurrent call - one more call than needed, for a little diversity/slack.
+TARGET_OPTIONS = 2
+_FANOUT_TEMPERATURES = (0.7, 0.65, 0.6)
+_WHITESPACE_RE = re.compile(r"\s+")
 
-def _get_user_id_from_request(request: Request) -> Optional[str]:
+# Generations in progress, keyed like the cache: identical concurrent requests share one
+_INFLIGHT: Dict[Tuple[str, str, str, str], "asyncio.Future[Optional[List[str]]]"] = {}
+
+
+def _get_user_from_request(request: Request) -> Tuple[Optional[str], dict]:
     """
-    Extract user_id from Bearer token via Supabase Auth.
-    Returns None if not authenticated (allows anonymous usage if desired).
+    Extract (user_id, jwt_claims) from Bearer token via Supabase Auth.
+    Claims are only decoded once Supabase has accepted the token.
+    Returns (None, {}) if not authenticated.
     """
     auth_header = request.headers.get("Authorization", "")
     if not auth_header.startswith("Bearer "):
-        return None
+        return None, {}
+
+    return _get_user_from_token(auth_header.replace("Bearer ", "").strip())
+
 
-    token = auth_header.replace("Bearer ", "").strip()
+def _get_user_from_token(token: str) -> Tuple[Optional[str], dict]:
+    """(user_id, jwt_claims) for a Supabase access token, or (None, {}) if it is invalid."""
     if not token:
-        return None
+        return None, {}
 
     try:
         supabase = get_supabase(admin=False)
         result = supabase.auth.get_user(token)
-        return result.user.id if result.user else None
+        if not result.user:
+            return None, {}
+        return result.user.id, decode_jwt_claims(token)
     except Exception as e:
         logger.warning(f"Failed to get user from token: {e}")
-        return None
+        return None, {}
+
+
+def _get_user_id_from_request(request: Request) -> Optional[str]:
+    """
+    Extract user_id from Bearer token via Supabase Auth.
+    Returns None if not authenticated (allows anonymous usage if desired).
+    """
+    return _get_user_from_request(request)[0]
 
 
 def _save_post_to_supabase(
@@ -171,9 +210,13 @@ class GenerateResponse(BaseModel):
     usage: Optional[dict] = None
 
 
+# Post text, stripped; empty/whitespace-only text is rejected with a 422 before the handler runs
+PostText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
 class PostRequest(BaseModel):
-    text: str
-    method: str = "manual"  # 'api' | 'manual' | 'community'
+    text: PostText
+    method: Literal["api", "manual", "community"] = "manual"
     tweet_url: Optional[str] = None
 
 
@@ -195,38 +238,335 @@ class WaitlistRequest(BaseModel):
 
 # If the user wants to just record a post without posting.
 class RecordRequest(PostRequest):
-    pass
+    method: Literal["manual", "community"] = "manual"
 
 @router.get("/config")
 def get_config():
     """Get application configuration."""
     return {
-        "remaining_writes": remaining_posts_this_month(),
+        "remaining_writes": cached_remaining_posts(),
         "community_url": os.environ.get("X_COMMUNITY_URL"),
-        "supabase_url": os.environ.get("SUPABASE_URL"),
-        "supabase_anon_key": os.environ.get("SUPABASE_ANON_KEY"),
+        "supabase_url": SUPABASE_URL or None,
+        "supabase_anon_key": SUPABASE_ANON_KEY or None,
+    }
+
+
+async def _remaining_writes() -> int:
+    """
+    cached_remaining_posts() for async handlers: a fresh cached value is
+    returned inline, a ledger rescan (a Supabase round-trip) runs in a thread.
+    """
+    remaining = peek_remaining_posts()
+    if remaining is None:
+        remaining = await anyio.to_thread.run_sync(cached_remaining_posts)
+    return remaining
+
+
+def _sse_event(data: dict) -> bytes:
+    """Encode one Server-Sent Events message."""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+def _log_generation_perf(user_id: str, mode: str, cache_hit: bool, total_ms: float, options_count: int) -> None:
+    """Record a /generate timing locally and in Supabase."""
+    append_perf({
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "mode": mode,
+        "cache_hit": cache_hit,
+        "gen_time_ms": round(total_ms, 1),
+        "options_count": options_count,
+    })
+    _save_perf_to_supabase(user_id, mode, cache_hit, round(total_ms, 1), options_count)
+
+
+def _dedupe_key(post: str) -> str:
+    """Case/whitespace-insensitive prefix, so near-identical generations count as duplicates."""
+    return _WHITESPACE_RE.sub(" ", post.lower().strip())[:128]
+
+
+async def _unique_options(prompt: str, mode: str) -> AsyncIterator[str]:
+    """
+    Yield up to TARGET_OPTIONS distinct posts as soon as they are available.
+    Starts with a single multi-candidate call; any shortfall is topped up with
+    concurrent single calls. Outstanding calls are cancelled once enough
+    options are in (or the consumer goes away).
+    """
+    async def _one_call(temperature: float = 0.7) -> str:
+        return (await gen.agenerate_human_post(prompt, mode, temperature)).strip()
+
+    seen = set()  # _dedupe_key() of every option yielded so far
+
+    # First round: one request for all candidates, so the prompt is prefilled once
+    try:
+        batch = await gen.agenerate_human_posts_batch(prompt, mode, len(_FANOUT_TEMPERATURES))
+    except Exception as e:
+        logger.warning(f"Batched generation failed, falling back to separate calls: {e}")
+        batch = None
+
+    if batch is not None:
+        for post in batch:
+            post = post.strip()
+            key = _dedupe_key(post)
+            if post and key not in seen:
+                seen.add(key)
+                yield post
+                if len(seen) >= TARGET_OPTIONS:
+                    return
+        # Filtered-out or duplicate candidates: top up with separate calls (plus one spare)
+        temperatures = (0.7,) * (TARGET_OPTIONS - len(seen) + 1)
+        rounds = 1
+    else:
+        # Fire one spare call alongside the target and keep the first unique results.
+        temperatures = _FANOUT_TEMPERATURES
+        rounds = 2  # initial fan-out, then at most one top-up round
+
+    for _ in range(rounds):
+        tasks = [asyncio.create_task(_one_call(t)) for t in temperatures]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    r = await fut
+                except Exception as e:
+                    logger.warning(f"Generation call failed: {e}")
+                    continue
+                key = _dedupe_key(r)
+                if r and key not in seen:
+                    seen.add(key)
+                    yield r
+                    if len(seen) >= TARGET_OPTIONS:
+                        break
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        needed = TARGET_OPTIONS - len(seen)
+        if needed <= 0:
+            break
+        # Duplicates or failures left us short: top up concurrently, again with one spare
+        temperatures = (0.7,) * (needed + 1)
+
+
+def _start_flight(cache_key: Tuple[str, str, str, str]):
+    """Register this request as the one generating `cache_key`."""
+    key = normalize_cache_key(cache_key)
+    flight = asyncio.get_running_loop().create_future()
+    _INFLIGHT[key] = flight
+    return key, flight
+
+
+def _end_flight(key: Tuple[str, str, str, str], flight: asyncio.Future, options: List[str]) -> None:
+    """Hand the result (None on failure) to any waiting requests."""
+    if _INFLIGHT.get(key) is flight:
+        del _INFLIGHT[key]
+    if not flight.done():
+        flight.set_result(options or None)
+
+
+async def _join_flight(cache_key: Tuple[str, str, str, str]) -> Optional[List[str]]:
+    """
+    Wait for an identical generation already in progress, if there is one.
+    Returns without suspending when there is none, so a caller can
+    _start_flight() right after with no chance for another request to slip in.
+    """
+    flight = _INFLIGHT.get(normalize_cache_key(cache_key))
+    if flight is None:
+        return None
+    # shield: a follower disconnecting must not cancel the shared future
+    return await asyncio.shield(flight)
+
+
+def _limit_reached_detail() -> dict:
+    """Paywall payload shared by the HTTP and WebSocket generate endpoints."""
+    return {
+        "error": "limit_reached",
+        "message": f"You've used all {FREE_DAILY_LIMIT} free generations today. Upgrade to continue.",
+        "checkout_url": os.environ.get("LEMONSQUEEZY_CHECKOUT_URL", ""),
+    }
+
+
+async def _build_flight_prompt(
+    mode: str,
+    daily_context: dict,
+    flight_key: Tuple[str, str, str, str],
+    flight: asyncio.Future,
+) -> str:
+    """
+    Build the prompt for a generation this request leads (only needed on a
+    cache/flight miss). build_prompt stats/reads the style and example files,
+    so it runs off the event loop; a failure resolves the flight.
+    """
+    try:
+        return await anyio.to_thread.run_sync(gen.build_prompt, mode, daily_context)
+    except BaseException:
+        _end_flight(flight_key, flight, [])
+        raise
+
+
+async def _finish_generation(
+    user_id: str,
+    claims: dict,
+    mode: str,
+    cache_key: Tuple[str, str, str, str],
+    options: List[str],
+    t0: float,
+) -> Tuple[float, dict]:
+    """Cache, log and bill a fresh generation. Returns (total_ms, usage)."""
+    await set_cached_options(cache_key, options)
+
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    _log_generation_perf(user_id, mode, False, total_ms, len(options))
+
+    # INCREMENT USAGE AFTER SUCCESS
+    if user_id:
+        await increment_usage(user_id)
+
+    return total_ms, await get_usage_status(user_id, claims)
+
+
+async def _generation_events(
+    user_id: str,
+    claims: dict,
+    mode: str,
+    cache_key: Tuple[str, str, str, str],
+    prompt: str,
+    t0: float,
+    flight_key: Tuple[str, str, str, str],
+    flight: asyncio.Future,
+) -> AsyncIterator[dict]:
+    """
+    Live generation as events: one per option, then a summary event.
+    The caller registers the flight (see _start_flight); it is resolved here.
+    """
+    options: List[str] = []
+    try:
+        try:
+            async for option in _unique_options(prompt, mode):
+                options.append(option)
+                yield {"option": option}
+        finally:
+            _end_flight(flight_key, flight, options)
+
+        if not options:
+            yield {"error": "Generation failed"}
+            return
+
+        total_ms, usage = await _finish_generation(user_id, claims, mode, cache_key, options, t0)
+        yield {
+            "done": True,
+            "mode": mode,
+            "remaining_writes": await _remaining_writes(),
+            "gen_time_ms": round(total_ms, 1),
+            "cache_hit": False,
+            "usage": usage,
+        }
+    except Exception as e:
+        logger.error(f"Unexpected error in /api/generate stream: {e}\n{traceback.format_exc()}")
+        yield {"error": f"Unexpected error: {str(e)}"}
+
+
+async def _cached_events(result: GenerateResponse) -> AsyncIterator[dict]:
+    """A cache hit as events: same shape as a live generation."""
+    for option in result.options:
+        yield {"option": option}
+    yield {
+        "done": True,
+        "mode": result.mode,
+        "remaining_writes": result.remaining_writes,
+        "gen_time_ms": result.gen_time_ms,
+        "cache_hit": True,
+        "usage": result.usage,
     }
 
 
+async def _as_sse(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield _sse_event(event)
+
+
+async def _cached_json_response(
+    user_id: str,
+    claims: dict,
+    mode: str,
+    options: List[str],
+    options_json: bytes,
+    t0: float,
+) -> Response:
+    """
+    JSON cache hit without building/validating a GenerateResponse: the
+    pre-serialized options are spliced into an otherwise tiny body.
+    """
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    _log_generation_perf(user_id, mode, True, total_ms, len(options))
+    remaining_writes = await _remaining_writes()
+    usage = await get_usage_status(user_id, claims)
+
+    # Same fields and order as GenerateResponse
+    body = b"".join((
+        b'{"mode":', orjson.dumps(mode),
+        b',"remaining_writes":', str(int(remaining_writes)).encode(),
+        b',"options":', options_json,
+        b',"gen_time_ms":', orjson.dumps(round(total_ms, 1)),
+        b',"cache_hit":true,"usage":', orjson.dumps(usage),
+        b"}",
+    ))
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"X-Gen-Time-Ms": f"{total_ms:.1f}", "X-Cache-Hit": "1"},
+    )
+
+
+async def _cached_result(user_id: str, claims: dict, mode: str, options: List[str], t0: float) -> GenerateResponse:
+    """Log and build the response for options served from the cache (or a coalesced request)."""
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    _log_generation_perf(user_id, mode, True, total_ms, len(options))
+    return GenerateResponse(
+        mode=mode,
+        remaining_writes=await _remaining_writes(),
+        options=options,
+        gen_time_ms=round(total_ms, 1),
+        cache_hit=True,
+        usage=await get_usage_status(user_id, claims),
+    )
+
+
+def _sse_response(
+    body: AsyncIterator[bytes],
+    cache_hit: bool,
+    background: Optional[BackgroundTask] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        background=background,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Cache-Hit": "1" if cache_hit else "0",
+        },
+    )
+
+
 @router.post("/generate", response_model=GenerateResponse)
 async def generate(req: GenerateRequest, request: Request, response: Response):
-    """Generate post options using AI."""
+    """
+    Generate post options using AI.
+
+    Clients that send `Accept: text/event-stream` get each option as an SSE
+    event as soon as it is ready, followed by a `done` event with the usual
+    metadata. Everyone else gets the JSON GenerateResponse.
+    """
     t0 = time.perf_counter()
+    want_stream = "text/event-stream" in request.headers.get("accept", "")
 
-    user_id = _get_user_id_from_request(request)
+    user_id, claims = _get_user_from_request(request)
     
     # PAYWALL CHECK
     if user_id:
-        allowed, remaining, reason = can_generate(user_id)
+        allowed, remaining, reason = await can_generate(user_id, claims)
         if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "limit_reached",
-                    "message": "You've used all 3 free generations today. Upgrade to continue.",
-                    "checkout_url": os.environ.get("LEMONSQUEEZY_CHECKOUT_URL", ""),
-                }
-            )
+            raise HTTPException(status_code=429, detail=_limit_reached_detail())
         
     else:
         raise HTTPException(
@@ -241,7 +581,6 @@ async def generate(req: GenerateRequest, request: Request, response: Response):
     if not all([today_context, current_mood, optional_angle]):
         raise HTTPException(status_code=400, detail="All fields required")
 
-    cache_hit = False
     try:
         mode = gen.pick_mode_for_today()
 
@@ -252,98 +591,53 @@ async def generate(req: GenerateRequest, request: Request, response: Response):
         }
         logger.info(f"Daily context: {daily_context}")
 
-        prompt = gen.build_prompt(mode, daily_context)
-        logger.info(f"Prompt built, length: {len(prompt)}")
-
         cache_key = (mode, today_context, current_mood, optional_angle)
-        cached = get_cached_options(cache_key)
+        hit = await get_cached_options_with_json(cache_key)
+        if hit is None:
+            # Same inputs already generating elsewhere: reuse that result like a cache hit
+            joined = await _join_flight(cache_key)
+            if joined:
+                hit = (joined, orjson.dumps(joined))
         
-        if cached:
-            cache_hit = True
-            total_ms = (time.perf_counter() - t0) * 1000.0
-
-            response.headers["X-Gen-Time-Ms"] = f"{total_ms:.1f}"
-            response.headers["X-Cache-Hit"] = "1"
+        if hit:
+            cached, cached_json = hit
+            if want_stream:
+                result = await _cached_result(user_id, claims, mode, cached, t0)
+                return _sse_response(_as_sse(_cached_events(result)), cache_hit=True)
+            return await _cached_json_response(user_id, claims, mode, cached, cached_json, t0)
+
+        # Lead the generation. Registered here rather than in the SSE body, which only
+        # starts after this handler returns, so identical requests arriving meanwhile join it.
+        flight_key, flight = _start_flight(cache_key)
+        prompt = await _build_flight_prompt(mode, daily_context, flight_key, flight)
+        logger.info(f"Prompt built, length: {len(prompt)}")
 
-            # Local perf log
-            append_perf({
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "mode": mode,
-                "cache_hit": True,
-                "gen_time_ms": round(total_ms, 1),
-                "options_count": len(cached),
-            })
-
-            # Supabase perf log
-            _save_perf_to_supabase(user_id, mode, True, round(total_ms, 1), len(cached))
-
-            return GenerateResponse(
-                mode=mode,
-                remaining_writes=remaining_posts_this_month(),
-                options=cached,
-                gen_time_ms=round(total_ms, 1),
-                cache_hit=True,
-                usage=get_usage_status(user_id),
+        if want_stream:
+            return _sse_response(
+                _as_sse(_generation_events(user_id, claims, mode, cache_key, prompt, t0, flight_key, flight)),
+                cache_hit=False,
+                # The body resolves the flight; this covers a body that is never iterated
+                background=BackgroundTask(_end_flight, flight_key, flight, []),
             )
 
-        async def _one_call() -> str:
-            return (await anyio.to_thread.run_sync(gen.generate_human_post, prompt, mode)).strip()
-
-        # also adjust the range lenght from 2 -> 3.
-        results = await asyncio.gather(*[_one_call() for _ in range(2)], return_exceptions=True)
-
         options: List[str] = []
-        seen = set()
-        for r in results:
-            if isinstance(r, Exception):
-                logger.warning(f"Generation call failed: {r}")
-                continue
-            if r and r not in seen:
-                seen.add(r)
-                options.append(r)
-
-        extra_tries = 1  # 2
-        while len(options) < 2 and extra_tries > 0:  # options initial length < 3
-            extra_tries -= 1
-            try:
-                post = (await anyio.to_thread.run_sync(gen.generate_human_post, prompt, mode)).strip()
-                if post and post not in seen:
-                    seen.add(post)
-                    options.append(post)
-            except Exception as e:
-                logger.warning(f"Extra generation try failed: {e}\n{traceback.format_exc()}")
-
+        try:
+            async for option in _unique_options(prompt, mode):
+                options.append(option)
+        finally:
+            _end_flight(flight_key, flight, options)
         if not options:
             raise HTTPException(status_code=500, detail="Generation failed")
 
-        set_cached_options(cache_key, options)
+        total_ms, usage = await _finish_generation(user_id, claims, mode, cache_key, options, t0)
 
-        total_ms = (time.perf_counter() - t0) * 1000.0
         response.headers["X-Gen-Time-Ms"] = f"{total_ms:.1f}"
         response.headers["X-Cache-Hit"] = "0"
         response.headers["X-Options-Count"] = str(len(options))
 
-        # Local perf log
-        append_perf({
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "mode": mode,
-            "cache_hit": False,
-            "gen_time_ms": round(total_ms, 1),
-            "options_count": len(options),
-        })
-
-        # Supabase perf log
-        _save_perf_to_supabase(user_id, mode, False, round(total_ms, 1), len(options))
-
-        # INCREMENT USAGE AFTER SUCCESS 
-        if user_id:
-            increment_usage(user_id)
-        
-        usage = get_usage_status(user_id)
-        
         return GenerateResponse(
             mode=mode,
-            remaining_writes=remaining_posts_this_month(),
+            remaining_writes=await _remaining_writes(),
             options=options,
             gen_time_ms=round(total_ms, 1),
             cache_hit=False,
@@ -356,6 +650,107 @@ async def generate(req: GenerateRequest, request: Request, response: Response):
         logger.error(f"Unexpected error in /api/generate: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+@ws_router.websocket("/ws/generate")
+async def ws_generate(websocket: WebSocket):
+    """
+    Generate post options over one long-lived connection, for repeated "regenerate" clicks.
+
+    Protocol (JSON text frames):
+    - first message authenticates: {"token": "<supabase access token>"}; the server
+      answers {"ready": true, "mode": ...} - user and mode are then fixed for the session
+    - every later message is a GenerateRequest-shaped object; omitted fields reuse the
+      previous message's values; anything that isn't a JSON object in a text frame gets
+      {"error": "invalid message"} and is otherwise ignored
+    - each request is answered with one {"option": ...} per option, then {"done": true, ...}
+      with the same fields as the SSE stream, or a single {"error": ...}
+    """
+    await websocket.accept()
+
+    async def send(event: dict) -> None:
+        await websocket.send_text(orjson.dumps(event).decode())
+
+    async def receive() -> Optional[dict]:
+        """Next JSON object from the client; None for a binary, malformed or non-object frame."""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        text = message.get("text")
+        if text is None:
+            return None
+        try:
+            msg = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            return None
+        return msg if isinstance(msg, dict) else None
+
+    try:
+        hello = await receive() or {}
+        token = str(hello.get("token") or "").strip()
+        # Supabase token check is a blocking HTTP call
+        user_id, claims = await anyio.to_thread.run_sync(_get_user_from_token, token)
+        if not user_id:
+            await send({"error": "Authentication required"})
+            await websocket.close(code=1008)
+            return
+
+        mode = gen.pick_mode_for_today()
+        context = {"today_context": "", "current_mood": "", "optional_angle": ""}
+        await send({"ready": True, "mode": mode})
+
+        async def handle(msg: dict) -> None:
+            t0 = time.perf_counter()
+            for field in context:
+                value = msg.get(field)
+                if value is not None:
+                    context[field] = str(value).strip()
+
+            if not all(context.values()):
+                await send({"error": "All fields required"})
+                return
+
+            # PAYWALL CHECK
+            allowed, remaining, reason = await can_generate(user_id, claims)
+            if not allowed:
+                await send(_limit_reached_detail())
+                return
+
+            cache_key = (mode, context["today_context"], context["current_mood"], context["optional_angle"])
+            cached = await get_cached_options(cache_key)
+            if not cached:
+                cached = await _join_flight(cache_key)
+
+            if cached:
+                events = _cached_events(await _cached_result(user_id, claims, mode, cached, t0))
+            else:
+                flight_key, flight = _start_flight(cache_key)
+                prompt = await _build_flight_prompt(mode, dict(context), flight_key, flight)
+                events = _generation_events(user_id, claims, mode, cache_key, prompt, t0, flight_key, flight)
+            try:
+                async for event in events:
+                    await send(event)
+            finally:
+                # A failed send leaves the generator suspended; close it so the flight resolves now
+                await events.aclose()
+
+        while True:
+            msg = await receive()
+            if msg is None:
+                # Don't treat garbage as "regenerate with the previous context"
+                await send({"error": "invalid message"})
+                continue
+            try:
+                await handle(msg)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # Keep the session open: report this request like the HTTP route's 500
+                logger.error(f"Unexpected error in /ws/generate: {e}\n{traceback.format_exc()}")
+                await send({"error": "Generation failed"})
+
+    except WebSocketDisconnect:
+        return
+
+
 @router.post("/post", response_model=PostResponse)
 async def post_to_x_api(req: PostRequest, request: Request):
     """
@@ -365,13 +760,10 @@ async def post_to_x_api(req: PostRequest, request: Request):
     - If method == 'manual' or 'community': records locally/Supabase, does NOT post via API.
     - If user has X account connected, attempts to match the posted tweet.
     """
-    text = (req.text or "").strip()
-    if not text:
-        raise HTTPException(status_code=400, detail="Empty text")
-
-    method = (req.method or "manual").lower()
-    if method not in ("api", "manual", "community"):
-        raise HTTPException(status_code=400, detail="method must be 'api', 'manual', or 'community'")
+    text = req.text
+    method = req.method
+    # Every response carries the manual-posting fallback link
+    intent_url = build_intent_url(text)
 
     user_id = _get_user_id_from_request(request)
     x_user_info = await _fetch_x_user_info(request)
@@ -386,18 +778,23 @@ async def post_to_x_api(req: PostRequest, request: Request):
         tweet_id = result.get("tweet_id")
         # Save post to Supabase ledger
         _save_post_to_supabase(user_id, text, method, tweet_id=tweet_id, tweet_url=_tweet_url(tweet_id) if tweet_id else None)
+        # API posts count against the monthly quota that remaining_writes is computed from
+        invalidate_remaining_posts_cache()
+        remaining = result.get("remaining")
+        if remaining is None:
+            remaining = await _remaining_writes()
         if result.get("success"):
             return PostResponse(
                 success=True,
                 tweet_id=tweet_id,
-                remaining=result.get("remaining", remaining_posts_this_month()),
-                intent_url=build_intent_url(text),
+                remaining=remaining,
+                intent_url=intent_url,
             )
         return PostResponse(
             success=False,
             error=result.get("error", "Unknown error"),
-            remaining=result.get("remaining", remaining_posts_this_month()),
-            intent_url=build_intent_url(text),
+            remaining=remaining,
+            intent_url=intent_url,
         )
 
     # Manual/community: do NOT call the API at all (no write quota usage)
@@ -443,15 +840,15 @@ async def post_to_x_api(req: PostRequest, request: Request):
     return PostResponse(
         success=True,
         tweet_id=tweet_id if matched_tweet_url is None else extract_tweet_id_from_url(matched_tweet_url),
-        remaining=remaining_posts_this_month(),
-        intent_url=matched_tweet_url if matched_tweet_url else build_intent_url(text),
+        remaining=await _remaining_writes(),
+        intent_url=matched_tweet_url or intent_url,
     )
 
 
 @router.post("/email")
 def email_options(req: EmailRequest):
     """Send post options via email."""
-    recipient_email = req.to_email or os.environ.get("TO_EMAIL")
+    recipient_email = req.to_email or TO_EMAIL
     if not recipient_email:
         raise HTTPException(status_code=500, detail="Recipient email not configured.")
     
@@ -490,13 +887,8 @@ async def join_waitlist(req: WaitlistRequest):
 
 @router.post("/record")
 def record_tweet_url(req: RecordRequest, request: Request):
-    text = (req.text or "").strip()
-    if not text:
-        raise HTTPException(status_code=400, detail="Empty text")
-
-    method = (req.method or "manual").lower()
-    if method not in ("manual", "community"):
-        raise HTTPException(status_code=400, detail="method must be 'manual' or 'community'")
+    text = req.text
+    method = req.method
 
     user_id = _get_user_id_from_request(request)
     tid = extract_tweet_id_from_url((req.tweet_url or "").strip())
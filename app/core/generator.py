@@ -3,21 +3,47 @@ Post generation module - handles AI-powered tweet/post generation.
 """
 
 import os
+import re
 import json
+import asyncio
+import time
 import random
-from datetime import datetime, timezone
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
 
 import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Configuration paths
 CONFIG_DIR = Path(__file__).parent.parent.parent / "config"
 STYLE_PROFILE_PATH = CONFIG_DIR / "style_profile.json"
 TRAINING_TWEETS_PATH = CONFIG_DIR / "training_tweets.json"
 
+# Gemini context cache for the stable prompt prefix (rules + style guidance)
+PREFIX_CACHE_TTL_SECONDS = 3600
+# How long a failed create (too few tokens, or just a blip/429/5xx) is remembered before retrying
+PREFIX_CACHE_RETRY_SECONDS = 300
+_PREFIX_CACHE_LOCK = threading.Lock()
+# model_name -> (prefix, created_ts, CachedContent | None); None = the API refused
+_PREFIX_CACHE: dict = {}
+# Models whose CachedContent is being created right now (outside the lock)
+_PREFIX_CACHE_CREATING: set = set()
+
+# API key genai.configure() was last called with (clients are reused until it changes)
+_GENAI_CONFIGURE_LOCK = threading.Lock()
+_GENAI_CONFIGURED_KEY = None
+
+# Cap on concurrent Gemini requests per worker (tune to the provider's RPM), so bursts
+# queue here instead of piling into 429s and retries. Shared by every async caller.
+LLM_MAX_PARALLEL = int(os.getenv("LLM_MAX_PARALLEL", "8"))
+_LLM_SEM = asyncio.Semaphore(LLM_MAX_PARALLEL)
+
 # Content rotation modes
 ROTATION = ["daily_wins", "lesson_learned", "shipping_update"]
 
@@ -92,12 +118,35 @@ BAD EXAMPLES (don't do this):
 - Long paragraphs with no structure ❌
 """
 
+# Suggested first line per content mode
+MODE_OPENERS = {
+    "daily_wins": "Today's wins:",
+    "lesson_learned": "Learned something today:",
+    "shipping_update": "Shipped some stuff:",
+}
+DEFAULT_OPENER = "Today's wins:"
+
+
+def _no_context_injection(opener: str) -> str:
+    return f"""
+No specific context provided. Create a realistic example post using the format.
+Suggested opener: "{opener}"
+"""
+
+
+# The no-notes prompt section only depends on the mode, so build it once
+_NO_CONTEXT_INJECTIONS = {m: _no_context_injection(o) for m, o in MODE_OPENERS.items()}
+_NO_CONTEXT_DEFAULT = _no_context_injection(DEFAULT_OPENER)
+
 AD_LIKE_PHRASES = [
     "introducing", "launching soon", "big announcement",
     "sign up now", "subscribe", "download now", "limited time",
     "game-changer", "revolutionary", "ultimate guide",
 ]
 
+# One alternation scan instead of a substring search per phrase
+_AD_LIKE_RE = re.compile("|".join(map(re.escape, AD_LIKE_PHRASES)))
+
 BANNED_PHRASES = [
     "the key is", "the real X is Y", "I'm convinced",
     "in my experience", "here's the thing", "hot take:",
@@ -106,8 +155,39 @@ BANNED_PHRASES = [
 
 def pick_mode_for_today() -> str:
     """Pick content mode based on current date."""
-    day_index = int(datetime.now(timezone.utc).strftime("%Y%m%d")) % len(ROTATION)
-    return ROTATION[day_index]
+    # toordinal() ticks once per UTC day, so this rotates daily without strftime.
+    return ROTATION[datetime.now(timezone.utc).toordinal() % len(ROTATION)]
+
+
+@lru_cache(maxsize=4)
+def _style_guidance(path: str, mtime_ns: int) -> str:
+    """
+    Formatted style guidance from style_profile.json.
+    Keyed by mtime so a re-run of the scraper is picked up without a restart.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+
+    g = profile.get("guidance", {})
+    char_lo, char_hi = (g.get("recommended_char_range") or [120, 280])
+    notes = g.get("notes", [])
+    notes = [str(note).strip() for note in notes if str(note).strip()]
+
+    notes_lines = ""
+    if notes:
+        notes_lines = "\n".join(f"- {note}" for note in notes)
+
+    out = [
+        "Style guidance:",
+        f"- Target {char_lo}–{char_hi} characters.",
+        "- Be specific about what you did.",
+        "- Energy is good. Personality is good.",
+    ]
+    if notes_lines:
+        out.append("Voice cues:")
+        out.append(notes_lines)
+
+    return "\n".join(out).strip()
 
 
 def load_style_guidance() -> str:
@@ -116,30 +196,8 @@ def load_style_guidance() -> str:
     If missing, returns empty string.
     """
     try:
-        with open(STYLE_PROFILE_PATH, "r", encoding="utf-8") as f:
-            profile = json.load(f)
-
-        g = profile.get("guidance", {})
-        char_lo, char_hi = (g.get("recommended_char_range") or [120, 280])
-        notes = g.get("notes", [])
-        notes = [str(note).strip() for note in notes if str(note).strip()]
-
-        notes_lines = ""
-        if notes:
-            notes_lines = "\n".join(f"- {note}" for note in notes)
-
-        out = [
-            "Style guidance:",
-            f"- Target {char_lo}–{char_hi} characters.",
-            "- Be specific about what you did.",
-            "- Energy is good. Personality is good.",
-        ]
-        if notes_lines:
-            out.append("Voice cues:")
-            out.append(notes_lines)
-
-        return "\n".join(out).strip()
-
+        mtime_ns = os.stat(STYLE_PROFILE_PATH).st_mtime_ns
+        return _style_guidance(str(STYLE_PROFILE_PATH), mtime_ns)
     except FileNotFoundError:
         return ""
     except (json.JSONDecodeError, OSError):
@@ -157,6 +215,18 @@ def _coerce_tweet_text(item) -> str:
     return str(item).strip()
 
 
+@lru_cache(maxsize=4)
+def _load_examples(path: str, mtime_ns: int) -> tuple:
+    """
+    Pre-formatted few-shot lines ("- tweet") from training_tweets.json.
+    Keyed by mtime so edits to the file are picked up without a restart.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        tweet_examples = json.load(file) or []
+    tweet_texts = (_coerce_tweet_text(t) for t in tweet_examples)
+    return tuple(f"- {t}" for t in tweet_texts if t)
+
+
 def get_daily_context() -> dict:
     """
     Get today's context from user input (CLI mode).
@@ -176,27 +246,72 @@ def get_daily_context() -> dict:
     }
 
 
+@lru_cache(maxsize=4)
+def _prefix_for_style(style: str) -> str:
+    style_block = f"\n\n{style}\n" if style else ""
+    return f"{PROMPT_RULES}{style_block}"
+
+
+def _prompt_prefix() -> str:
+    """Stable head shared by every prompt: rules + style guidance."""
+    return _prefix_for_style(load_style_guidance())
+
+
+def _cached_prefix(model_name: str, prefix: str):
+    """
+    Get (or create) a Gemini CachedContent holding `prefix`.
+    Returns None when context caching isn't available for this prefix/model;
+    a failure is remembered for PREFIX_CACHE_RETRY_SECONDS so we don't retry
+    on every call. Only one thread creates at a time, and the others don't
+    wait for it: they keep using the current handle (or go uncached).
+    """
+    now = time.time()
+    with _PREFIX_CACHE_LOCK:
+        current = None
+        entry = _PREFIX_CACHE.get(model_name)
+        if entry and entry[0] == prefix:
+            _, created, handle = entry
+            age = now - created
+            if handle is None:
+                if age < PREFIX_CACHE_RETRY_SECONDS:
+                    return None
+            # Refresh a little before the server-side TTL runs out
+            elif age < PREFIX_CACHE_TTL_SECONDS - 60:
+                return handle
+            elif age < PREFIX_CACHE_TTL_SECONDS:
+                current = handle
+
+        if model_name in _PREFIX_CACHE_CREATING:
+            return current
+        _PREFIX_CACHE_CREATING.add(model_name)
+
+    handle = None
+    try:
+        handle = genai.caching.CachedContent.create(
+            model=model_name,
+            contents=[prefix],
+            ttl=timedelta(seconds=PREFIX_CACHE_TTL_SECONDS),
+        )
+    except Exception as e:
+        logger.info(f"Prompt prefix caching unavailable for {model_name}: {e}")
+    finally:
+        with _PREFIX_CACHE_LOCK:
+            _PREFIX_CACHE[model_name] = (prefix, time.time(), handle)
+            _PREFIX_CACHE_CREATING.discard(model_name)
+    return handle
+
+
 def build_prompt(mode: str, daily_context: dict = None) -> str:
     """Build the full prompt for AI generation."""
     
-    mode_openers = {
-        "daily_wins": "Today's wins:",
-        "lesson_learned": "Learned something today:",
-        "shipping_update": "Shipped some stuff:",
-    }
-    
-    suggested_opener = mode_openers.get(mode, "Today's wins:")
+    suggested_opener = MODE_OPENERS.get(mode, DEFAULT_OPENER)
 
     texts = ""
     try:
-        with open(TRAINING_TWEETS_PATH, "r", encoding="utf-8") as file:
-            tweet_examples = json.load(file) or []
-            tweet_texts = [_coerce_tweet_text(t) for t in tweet_examples]
-            tweet_texts = [t for t in tweet_texts if t]
-
-            if tweet_texts:
-                sample_tweets = random.sample(tweet_texts, min(3, len(tweet_texts)))
-                texts = "\n".join(f"- {t}" for t in sample_tweets)
+        mtime_ns = os.stat(TRAINING_TWEETS_PATH).st_mtime_ns
+        pool = _load_examples(str(TRAINING_TWEETS_PATH), mtime_ns)
+        if pool:
+            texts = "\n".join(random.sample(pool, min(3, len(pool))))
     except (FileNotFoundError, json.JSONDecodeError, OSError, ValueError):
         texts = ""
 
@@ -207,9 +322,6 @@ Reference tone (match the vibe, not the words):
 {texts}
 """.strip()
 
-    style = load_style_guidance()
-    style_block = f"\n\n{style}\n" if style else ""
-
     # Add daily context if provided
     context_injection = ""
     if daily_context and daily_context.get("today_context"):
@@ -229,13 +341,10 @@ INSTRUCTIONS:
 - Keep their personality, just structure it nicely
 """
     else:
-        context_injection = f"""
-No specific context provided. Create a realistic example post using the format.
-Suggested opener: "{suggested_opener}"
-"""
+        context_injection = _NO_CONTEXT_INJECTIONS.get(mode, _NO_CONTEXT_DEFAULT)
 
     tail = "\n\n".join(x for x in [few_shot, context_injection, "Write the post now:"] if x)
-    return f"{PROMPT_RULES}{style_block}\n\n{tail}"
+    return f"{_prompt_prefix()}\n\n{tail}"
 
 
 def is_ad_like(text: str) -> bool:
@@ -245,7 +354,7 @@ def is_ad_like(text: str) -> bool:
         return True
     if len(text) > 500:
         return True
-    return any(p in t for p in AD_LIKE_PHRASES)
+    return _AD_LIKE_RE.search(t) is not None
 
 
 def has_banned_phrases(text: str) -> bool:
@@ -259,20 +368,36 @@ def has_correct_format(text: str) -> bool:
     return "→" in text or "->" in text
 
 
-def generate_with_gemini(prompt: str, temperature: float = 0.7) -> str:
-    """Call Gemini API to generate content."""
-    api_key = os.environ["GOOGLE_API_KEY"]
+def _configure_genai(api_key: str) -> None:
+    """
+    Configure the Gemini SDK once per API key. genai.configure() drops the
+    SDK's cached clients (and their pooled gRPC channel), so it must not run per call.
+    """
+    global _GENAI_CONFIGURED_KEY
+    if _GENAI_CONFIGURED_KEY == api_key:
+        return
+    with _GENAI_CONFIGURE_LOCK:
+        if _GENAI_CONFIGURED_KEY != api_key:
+            genai.configure(api_key=api_key)
+            _GENAI_CONFIGURED_KEY = api_key
+
+
+def _model_for_prompt(prompt: str):
+    """
+    Pick the model handle and contents for a prompt.
+    Sends only the variable tail when the stable prefix is cached server-side.
+    """
     model_name = os.environ["MODEL_NAME"]
+    _configure_genai(os.environ["GOOGLE_API_KEY"])
 
-    genai.configure(api_key=api_key)
-    llm = genai.GenerativeModel(model_name=model_name)
+    prefix = _prompt_prefix()
+    cached = _cached_prefix(model_name, prefix) if prompt.startswith(prefix) else None
+    if cached is not None:
+        return genai.GenerativeModel.from_cached_content(cached_content=cached), prompt[len(prefix):]
+    return genai.GenerativeModel(model_name=model_name), prompt
 
-    response = llm.generate_content(
-        contents=prompt,
-        generation_config={"temperature": temperature},
-    )
 
-    text = getattr(response, "text", "") or ""
+def _clean_response_text(text: str) -> str:
     text = text.strip()
     
     # Clean up any markdown code blocks if present
@@ -280,30 +405,113 @@ def generate_with_gemini(prompt: str, temperature: float = 0.7) -> str:
         lines = text.split("\n")
         lines = [l for l in lines if not l.startswith("```")]
         text = "\n".join(lines).strip()
-    
+    return text
+
+
+def _response_text(response) -> str:
+    """Extract and clean the text of a Gemini response."""
+    text = _clean_response_text(getattr(response, "text", "") or "")
     if not text:
         raise RuntimeError(f"Empty response from Gemini: {response!r}")
     return text
 
 
+def _candidate_texts(response) -> list:
+    """Cleaned, non-empty text of every candidate in a Gemini response."""
+    texts = []
+    for candidate in getattr(response, "candidates", None) or []:
+        parts = getattr(getattr(candidate, "content", None), "parts", None) or []
+        text = _clean_response_text("".join(getattr(part, "text", "") for part in parts))
+        if text:
+            texts.append(text)
+    return texts
+
+
+def generate_with_gemini(prompt: str, temperature: float = 0.7) -> str:
+    """Call Gemini API to generate content."""
+    llm, contents = _model_for_prompt(prompt)
+
+    response = llm.generate_content(
+        contents=contents,
+        generation_config={"temperature": temperature},
+    )
+    return _response_text(response)
+
+
+async def agenerate_with_gemini(prompt: str, temperature: float = 0.7) -> str:
+    """Async generate_with_gemini: the model call itself runs on the event loop."""
+    # Model setup may read config files / create the prefix cache - keep it off the loop
+    llm, contents = await asyncio.to_thread(_model_for_prompt, prompt)
+
+    async with _LLM_SEM:
+        response = await llm.generate_content_async(
+            contents=contents,
+            generation_config={"temperature": temperature},
+        )
+    return _response_text(response)
+
+
+async def agenerate_candidates_with_gemini(prompt: str, n: int, temperature: float = 0.7) -> list:
+    """One Gemini request for up to `n` candidates, so the prompt is only processed once."""
+    llm, contents = await asyncio.to_thread(_model_for_prompt, prompt)
+
+    async with _LLM_SEM:
+        response = await llm.generate_content_async(
+            contents=contents,
+            generation_config={"temperature": temperature, "candidate_count": n},
+        )
+    texts = _candidate_texts(response)
+    if not texts:
+        raise RuntimeError(f"Empty response from Gemini: {response!r}")
+    return texts
+
+
+def _passes_filters(post: str) -> bool:
+    """Quality filters every generated post must pass."""
+    return (not is_ad_like(post) and 
+            not has_banned_phrases(post) and 
+            has_correct_format(post))
+
+
+# Fallback: ask for format fix
+REWRITE_SUFFIX = (
+    "\n\nIMPORTANT: Use the → arrow format. Include 2-4 bullet points. "
+    "Add personality. Keep it under 280 chars."
+)
+
+
 def generate_human_post(prompt: str, mode: str) -> str:
     """Generate a single human-sounding post with quality filters."""
     # Higher temperature for more personality
     for temp in (0.7, 0.6, 0.5):
         post = generate_with_gemini(prompt, temperature=temp)
+        if _passes_filters(post):
+            return post
 
-        if (not is_ad_like(post) and 
-            not has_banned_phrases(post) and 
-            has_correct_format(post)):
+    return generate_with_gemini(prompt + REWRITE_SUFFIX, temperature=0.6)
+
+
+async def agenerate_human_post(prompt: str, mode: str, temperature: float = 0.7) -> str:
+    """
+    Async generate_human_post. Retries step down from `temperature`,
+    so concurrent callers can start at slightly different temperatures.
+    """
+    for temp in (temperature, temperature - 0.1, temperature - 0.2):
+        post = await agenerate_with_gemini(prompt, temperature=temp)
+        if _passes_filters(post):
             return post
 
-    # Fallback: ask for format fix
-    rewrite_prompt = (
-        prompt
-        + "\n\nIMPORTANT: Use the → arrow format. Include 2-4 bullet points. "
-          "Add personality. Keep it under 280 chars."
-    )
-    return generate_with_gemini(rewrite_prompt, temperature=0.6)
+    return await agenerate_with_gemini(prompt + REWRITE_SUFFIX, temperature=0.6)
+
+
+async def agenerate_human_posts_batch(prompt: str, mode: str, n: int = 3, temperature: float = 0.7) -> list:
+    """
+    Up to `n` posts from a single Gemini call. Candidates that fail the
+    quality filters are dropped rather than retried; callers top up with
+    agenerate_human_post() if they need more.
+    """
+    posts = await agenerate_candidates_with_gemini(prompt, n, temperature)
+    return [post for post in posts if _passes_filters(post)]
 
 
 def generate_multiple_options(prompt: str, mode: str, count: int = 3) -> list:
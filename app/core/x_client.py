@@ -12,6 +12,7 @@ import webbrowser
 import anyio
 import requests
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from urllib.parse import urlencode
 
@@ -81,10 +82,15 @@ def _save_ledger(data: dict) -> None:
     LEDGER_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
 
+@lru_cache(maxsize=4)
+def _month_for_day(epoch_day: int) -> str:
+    return datetime.fromtimestamp(epoch_day * 86400, tz=timezone.utc).strftime("%Y-%m")
+
+
 def _month_key(ts: float = None) -> str:
     """Get the current month key for tracking monthly usage."""
-    dt = datetime.fromtimestamp(ts or time.time(), tz=timezone.utc)
-    return dt.strftime("%Y-%m")
+    # Month only changes at a UTC day boundary, so strftime runs once per day
+    return _month_for_day(int(ts or time.time()) // 86400)
 
 
 def remaining_posts_this_month() -> int:
@@ -95,6 +101,36 @@ def remaining_posts_this_month() -> int:
     return max(0, MAX_WRITES - used)
 
 
+# (fetched_at, remaining) - shared by concurrent requests for a short window
+REMAINING_CACHE_TTL_SECONDS = 30
+_REMAINING_CACHE: tuple[float, int] | None = None
+
+
+def peek_remaining_posts() -> int | None:
+    """The cached remaining-posts count if it is still fresh, else None (never touches the ledger)."""
+    cached = _REMAINING_CACHE
+    if cached is not None and time.monotonic() - cached[0] < REMAINING_CACHE_TTL_SECONDS:
+        return cached[1]
+    return None
+
+
+def cached_remaining_posts() -> int:
+    """remaining_posts_this_month(), reusing the last ledger scan for up to 30s."""
+    global _REMAINING_CACHE
+    now = time.monotonic()
+    if _REMAINING_CACHE is not None and now - _REMAINING_CACHE[0] < REMAINING_CACHE_TTL_SECONDS:
+        return _REMAINING_CACHE[1]
+    remaining = remaining_posts_this_month()
+    _REMAINING_CACHE = (now, remaining)
+    return remaining
+
+
+def invalidate_remaining_posts_cache() -> None:
+    """Make the next cached_remaining_posts() rescan the ledger (call after recording a post)."""
+    global _REMAINING_CACHE
+    _REMAINING_CACHE = None
+
+
 def was_recently_posted(text: str, days: int = 2) -> bool:
     """Check if same text was posted recently (duplicate guard)."""
     led = _load_ledger()
@@ -139,6 +175,7 @@ def record_post_to_ledger(
                 rec["tweet_url"] = tweet_url or _tweet_url(tweet_id)
                 led[rid] = rec
                 _save_ledger(led)
+                invalidate_remaining_posts_cache()
             return
 
     # Otherwise insert new record
@@ -152,6 +189,7 @@ def record_post_to_ledger(
         "tweet_url": (tweet_url or (_tweet_url(tweet_id) if tweet_id else None)),
     }
     _save_ledger(led)
+    invalidate_remaining_posts_cache()
 
 
 def build_intent_url(tweet_text: str) -> str:
@@ -175,20 +213,21 @@ def post_to_x(tweet_text: str) -> dict:
         dummy_request = Request(scope={"type": "http"})
         x_user_info = _fetch_x_user_info(dummy_request)
         if not x_user_info:
-            return {"success": False, "tweet_id": None, "error": "X account not connected", "remaining": remaining_posts_this_month()}
+            return {"success": False, "tweet_id": None, "error": "X account not connected", "remaining": cached_remaining_posts()}
         # user_access_token = x_user_info.get("access_token")
     except Exception:
-        return {"success": False, "tweet_id": None, "error": "Failed to fetch X user info", "remaining": remaining_posts_this_month()}
+        return {"success": False, "tweet_id": None, "error": "Failed to fetch X user info", "remaining": cached_remaining_posts()}
     
     if not tweet_text:
-        return {"success": False, "tweet_id": None, "error": "empty_text", "remaining": remaining_posts_this_month()}
+        return {"success": False, "tweet_id": None, "error": "empty_text", "remaining": cached_remaining_posts()}
     
     if len(tweet_text) > 280:
-        return {"success": False, "tweet_id": None, "error": "over_280_chars", "remaining": remaining_posts_this_month()}
+        return {"success": False, "tweet_id": None, "error": "over_280_chars", "remaining": cached_remaining_posts()}
     
     if was_recently_posted(tweet_text, days=2):
-        return {"success": False, "tweet_id": None, "error": "duplicate_guard_48h", "remaining": remaining_posts_this_month()}
+        return {"success": False, "tweet_id": None, "error": "duplicate_guard_48h", "remaining": cached_remaining_posts()}
     
+    # Exact count here: this gate decides whether we spend a write
     if remaining_posts_this_month() <= 0:
         return {"success": False, "tweet_id": None, "error": "monthly_quota_reached", "remaining": 0}
 
@@ -203,10 +242,10 @@ def post_to_x(tweet_text: str) -> dict:
         response = client.create_tweet(text=tweet_text)
         tid = response.data["id"]
         record_post_to_ledger(tweet_text, method="api", tweet_id=tid)
-        return {"success": True, "tweet_id": tid, "error": None, "remaining": remaining_posts_this_month()}
+        return {"success": True, "tweet_id": tid, "error": None, "remaining": cached_remaining_posts()}
     except Exception as e:
         # Common: 403 duplicate, 429 rate limit
-        return {"success": False, "tweet_id": None, "error": str(e), "remaining": remaining_posts_this_month()}
+        return {"success": False, "tweet_id": None, "error": str(e), "remaining": cached_remaining_posts()}
 
 
 def open_community_with_clipboard(tweet_text: str) -> dict:
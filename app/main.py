@@ -2,19 +2,94 @@
 FastAPI application factory - creates and configures the app.
 """
 
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from anyio import to_thread
+from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse, FileResponse
 
-from app.api.routes import router as api_router
+from app.api.routes import router as api_router, ws_router
+from app.core import generator as gen
 from app.api.auth import router as auth_router
 from app.api.x_auth import router as x_auth_router
 from app.api.analytics import router as analytics_router
 from app.api.payments import router as payments_router
 from app.api.foundation import router as foundation_router
+from app.utils.cache import perf_writer, flush_perf_queue
+from app.utils.cors import StaticCORSMiddleware
+from app.utils.email import close_email_session
+from app.utils.static_cache import load_static_cache, serve_static
+from app.utils.supabase import close_async_http
+from app.utils.usage import usage_flusher, flush_pending_usage
+
+logger = logging.getLogger(__name__)
+
+# Web frontend directory (resolved once at import)
+WEB_PATH = Path(__file__).resolve().parent.parent / "web"
+
+# Worker threads for blocking calls (sync routes, Supabase/Gemini SDK calls), per uvicorn worker.
+# The library defaults (40 anyio tokens, min(32, cpu+4) executor threads) queue bursts of LLM fan-out.
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "64"))
+
+# Per-request /generate helpers slower than this (warm) get flagged at startup
+HOT_PATH_WARN_MS = 5.0
+
+
+def _size_thread_pools() -> None:
+    """Size both thread pools: anyio's (sync endpoints, run_sync) and asyncio's (to_thread)."""
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="io")
+    )
+
+
+def _probe_generate_hot_path() -> None:
+    """Warm the prompt caches and flag regressions in per-request /generate work."""
+    sample_context = {"today_context": "probe", "current_mood": "probe", "optional_angle": "probe"}
+    probes = (
+        ("pick_mode_for_today", gen.pick_mode_for_today),
+        ("build_prompt", lambda: gen.build_prompt(gen.ROTATION[0], sample_context)),
+    )
+    for name, fn in probes:
+        try:
+            fn()  # first call fills the file-backed caches
+            t0 = time.perf_counter()
+            fn()
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        except Exception as e:
+            logger.warning(f"Startup probe for {name} failed: {e}")
+            continue
+        if elapsed_ms > HOT_PATH_WARN_MS:
+            logger.warning(f"{name} took {elapsed_ms:.1f}ms (warm); it runs on every /generate request")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup/shutdown: thread pools, warm caches, background writers."""
+    _size_thread_pools()
+    _probe_generate_hot_path()
+    load_static_cache(WEB_PATH)
+
+    # Background writers (one set per worker)
+    usage_task = asyncio.create_task(usage_flusher())
+    perf_task = asyncio.create_task(perf_writer())
+    try:
+        yield
+    finally:
+        for task in (usage_task, perf_task):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await flush_pending_usage()
+        await flush_perf_queue()
+        await close_async_http()
+        close_email_session()
 
 
 def create_app() -> FastAPI:
@@ -22,7 +97,8 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="Banger API",
         version="1.0.0",
-        description="X/Twitter Post Generator API"
+        description="X/Twitter Post Generator API",
+        lifespan=lifespan,
     )
     
     # CORS middleware
@@ -33,22 +109,16 @@ def create_app() -> FastAPI:
         "http://localhost:8000",
     ]
 
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=allowed_origins,
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
+    # Same policy as CORSMiddleware(allow_credentials=True, allow_methods/headers=["*"]),
+    # but with the origin set and response headers precomputed once.
+    # Preflights are cached by browsers for a day (Chromium caps this at 2h).
+    app.add_middleware(StaticCORSMiddleware, allow_origins=allowed_origins, max_age=86400)
 
-    
-    # Mount static files for web frontend
-    web_path = Path(__file__).parent.parent / "web"
 
     # Serve robots.txt for SEO and crawler intructions.
     @app.get("/robots.txt", response_class=FileResponse)
     async def serve_robots():
-        robot_file = web_path / "robots.txt"
+        robot_file = WEB_PATH / "robots.txt"
         if robot_file.exists():
             return FileResponse(robot_file, media_type="text/plain")
         return FileResponse(status_code=404)
@@ -57,7 +127,7 @@ def create_app() -> FastAPI:
     # Server sitemap.xml at root for SEO and crawler instructions.
     @app.get("/sitemap.xml", response_class=FileResponse)
     async def serve_sitemap():
-        sitemap_file = web_path / "sitemap.xml"
+        sitemap_file = WEB_PATH / "sitemap.xml"
         if sitemap_file.exists():
             return FileResponse(sitemap_file, media_type="application/xml")
         return FileResponse(status_code=404)
@@ -65,14 +135,14 @@ def create_app() -> FastAPI:
     
     @app.get("/bingsiteauth.xml", response_class=FileResponse)
     async def serve_bing_site_auth():
-        bing_file = web_path / "BingSiteAuth.xml"
+        bing_file = WEB_PATH / "BingSiteAuth.xml"
         if bing_file.exists():
             return FileResponse(bing_file, media_type="application/xml")
         return FileResponse(status_code=404)
 
     @app.get("/7f2fa4ba0aa0442c833ef9145c9e4d85.txt", response_class=FileResponse)
     async def serve_indexnow_key():
-        key_file = web_path / "7f2fa4ba0aa0442c833ef9145c9e4d85.txt"
+        key_file = WEB_PATH / "7f2fa4ba0aa0442c833ef9145c9e4d85.txt"
         if key_file.exists():
             return FileResponse(key_file, media_type="text/plain")
         return FileResponse(status_code=404)
@@ -81,44 +151,51 @@ def create_app() -> FastAPI:
     # Root redirect to web frontend
     @app.get("/", response_class=FileResponse)
     @app.get("/landing", response_class=FileResponse)
-    async def root_redirect():
-        return FileResponse(web_path / "landing.html")    
+    async def root_redirect(request: Request):
+        return serve_static("landing.html", request)
 
     # Create cleaner url for frontend pages.
     @app.get("/dashboard")
-    async def serve_dashboard():
-        return FileResponse(web_path / "dashboard.html")
+    async def serve_dashboard(request: Request):
+        return serve_static("dashboard.html", request)
     
     @app.get("/auth")
-    async def serve_auth():
-        return FileResponse(web_path / "auth.html")
+    async def serve_auth(request: Request):
+        return serve_static("auth.html", request)
     
     @app.get("/terms")
-    async def serve_terms():
-        return FileResponse(web_path / "terms.html")
+    async def serve_terms(request: Request):
+        return serve_static("terms.html", request)
     
     @app.get("/about")
-    async def serve_about():
-        return FileResponse(web_path / "about.html")
+    async def serve_about(request: Request):
+        return serve_static("about.html", request)
     
     @app.get("/callback")
-    async def serve_callback():
-        return FileResponse(web_path / "callback.html")
+    async def serve_callback(request: Request):
+        return serve_static("callback.html", request)
     
     @app.get("/x-callback")
-    async def serve_x_callback():
-        return FileResponse(web_path / "x-callback.html")
+    async def serve_x_callback(request: Request):
+        return serve_static("x-callback.html", request)
 
     # Health check endpoint
     @app.get("/health")
     async def health_check():
         return {"status": "healthy", "service": "Banger"}
 
-    if web_path.exists():
-        app.mount("/web", StaticFiles(directory=web_path, html=True), name="web")
+    # Static web frontend, served from an in-memory table built at startup (see lifespan)
+    @app.get("/web", include_in_schema=False)
+    async def redirect_web():
+        return RedirectResponse(url="/web/")
+
+    @app.api_route("/web/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def serve_web(path: str, request: Request):
+        return serve_static(path, request)
 
     # Register API routes
     app.include_router(api_router)
+    app.include_router(ws_router)
     app.include_router(auth_router)
     app.include_router(payments_router)
     app.include_router(x_auth_router)
@@ -2,51 +2,234 @@
 Caching utilities for the Banger application.
 """
 
+import os
 import time
-import json
+import asyncio
 import logging
+import sqlite3
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 from pathlib import Path
 
+import anyio
+import orjson
+
 logger = logging.getLogger(__name__)
 
 # Data paths
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 PERF_LOG_PATH = DATA_DIR / "perf_log.jsonl"
 
-# Generation cache
-_GEN_CACHE: Dict[Tuple[str, str, str, str], Tuple[float, List[str]]] = {}
+# Perf entries waiting for perf_writer(); bounded so a stuck disk can't grow memory
+_PERF_QUEUE: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=10_000)
+PERF_BATCH_DELAY_SECONDS = 0.5
+_perf_writer_running = False
+# read_perf_entries() reads small logs whole, larger ones backwards in chunks
+_PERF_TAIL_FULL_READ_BYTES = 64 * 1024
+_PERF_TAIL_CHUNK_BYTES = 8 * 1024
+
+# Generation cache: exact lookup on a normalized key (memory, then disk).
+# key -> (timestamp, options, options as JSON bytes), kept in LRU order
+_GEN_CACHE: "OrderedDict[Tuple[str, str, str, str], Tuple[float, List[str], bytes]]" = OrderedDict()
 _GEN_CACHE_TTL_SECONDS = 120  # 2 minutes
+_GEN_CACHE_MAX_ENTRIES = 512
+
+# Shared exact-key tier on disk: shared by all workers and survives worker restarts
+# (not redeploys - data/ is not on a persistent disk). Only touched from worker threads.
+GEN_CACHE_DB_PATH = DATA_DIR / "gen_cache.sqlite3"
+_gen_db: Optional[sqlite3.Connection] = None
+_gen_db_lock = threading.Lock()
+
+
+def normalize_cache_key(key: Tuple[str, str, str, str]) -> Tuple[str, str, str, str]:
+    """
+    Normalize only casing and whitespace (ends and internal runs) of each text field.
+    Word order and punctuation are kept: "fixed login, broke signup" and
+    "broke login, fixed signup" must never share cached drafts.
+    """
+    mode, *fields = key
+    return (mode, *(" ".join(f.lower().split()) for f in fields))
 
 
-def get_cached_options(key: Tuple[str, str, str, str]) -> Optional[List[str]]:
-    """Get cached generation results if still valid."""
-    item = _GEN_CACHE.get(key)  # a tuple of (timestamp, options)
-    if not item:
+def _get_gen_db() -> sqlite3.Connection:
+    """Open (once) the on-disk generation cache. Call with _gen_db_lock held."""
+    global _gen_db
+    if _gen_db is None:
+        GEN_CACHE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(GEN_CACHE_DB_PATH, timeout=0.5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS gen_cache (key BLOB PRIMARY KEY, ts REAL NOT NULL, options BLOB NOT NULL)")
+        _gen_db = conn
+    return _gen_db
+
+
+def _disk_get(norm_key: Tuple[str, str, str, str], now: float) -> Optional[Tuple[float, List[str], bytes]]:
+    try:
+        with _gen_db_lock:
+            row = _get_gen_db().execute(
+                "SELECT ts, options FROM gen_cache WHERE key = ? AND ts >= ?",
+                (orjson.dumps(norm_key), now - _GEN_CACHE_TTL_SECONDS),
+            ).fetchone()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Generation cache read failed: {e}")
         return None
-    ts, options = item
-    if (time.time() - ts) > _GEN_CACHE_TTL_SECONDS:
-        _GEN_CACHE.pop(key, None)
+    if row is None:
         return None
-    return options
+    return row[0], orjson.loads(row[1]), bytes(row[1])
+
 
+def _disk_set(norm_key: Tuple[str, str, str, str], ts: float, options_json: bytes) -> None:
+    try:
+        with _gen_db_lock:
+            db = _get_gen_db()
+            db.execute(
+                "INSERT OR REPLACE INTO gen_cache (key, ts, options) VALUES (?, ?, ?)",
+                (orjson.dumps(norm_key), ts, options_json),
+            )
+            db.execute("DELETE FROM gen_cache WHERE ts < ?", (ts - _GEN_CACHE_TTL_SECONDS,))
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Generation cache write failed: {e}")
 
-def set_cached_options(key: Tuple[str, str, str, str], options: List[str]) -> None:
-    """Cache generation results."""
-    _GEN_CACHE[key] = (time.time(), options)
 
+def _remember(norm_key: Tuple[str, str, str, str], ts: float, options: List[str], options_json: bytes) -> None:
+    """Insert into the in-memory LRU tier."""
+    _GEN_CACHE[norm_key] = (ts, options, options_json)
+    _GEN_CACHE.move_to_end(norm_key)
+    while len(_GEN_CACHE) > _GEN_CACHE_MAX_ENTRIES:
+        _GEN_CACHE.popitem(last=False)
 
-def append_perf(entry: Dict) -> None:
-    """Append performance metrics to log file."""
+
+async def get_cached_options_with_json(key: Tuple[str, str, str, str]) -> Optional[Tuple[List[str], bytes]]:
+    """
+    Get cached generation results if still valid, with the options already
+    serialized as a JSON array (so a cache hit can be answered without re-encoding).
+    Looked up in memory, then in the shared on-disk tier, by normalized key:
+    re-submitting the same notes with different casing or spacing doesn't
+    trigger a fresh generation, but any other change does.
+    """
+    now = time.time()
+    norm_key = normalize_cache_key(key)
+
+    item = _GEN_CACHE.get(norm_key)
+    if item:
+        if (now - item[0]) <= _GEN_CACHE_TTL_SECONDS:
+            _GEN_CACHE.move_to_end(norm_key)
+            return item[1], item[2]
+        _GEN_CACHE.pop(norm_key, None)
+
+    # Exact hit stored by another worker (or before a restart). SQLite may wait on
+    # another worker's write lock, so keep it off the event loop.
+    stored = await anyio.to_thread.run_sync(_disk_get, norm_key, now)
+    if stored is not None:
+        _remember(norm_key, *stored)
+        return stored[1], stored[2]
+    return None
+
+
+async def get_cached_options(key: Tuple[str, str, str, str]) -> Optional[List[str]]:
+    """Get cached generation results if still valid (see get_cached_options_with_json)."""
+    hit = await get_cached_options_with_json(key)
+    return hit[0] if hit else None
+
+
+async def set_cached_options(key: Tuple[str, str, str, str], options: List[str]) -> None:
+    """Cache generation results (visible in memory immediately, on disk once written)."""
+    norm_key = normalize_cache_key(key)
+    now = time.time()
+    options_json = orjson.dumps(options)
+    _remember(norm_key, now, options, options_json)
+    await anyio.to_thread.run_sync(_disk_set, norm_key, now, options_json)
+
+
+def _write_perf_batch(entries: List[Dict]) -> None:
+    """Append perf entries to the log file with a single open/write."""
     try:
         PERF_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with PERF_LOG_PATH.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        with PERF_LOG_PATH.open("ab") as f:
+            f.write(b"".join(orjson.dumps(entry) + b"\n" for entry in entries))
     except Exception as e:
         logger.warning(f"Failed to write perf log: {e}")
 
 
+def _drain_perf_queue() -> List[Dict]:
+    batch = []
+    while True:
+        try:
+            batch.append(_PERF_QUEUE.get_nowait())
+        except asyncio.QueueEmpty:
+            return batch
+
+
+def append_perf(entry: Dict) -> None:
+    """
+    Append performance metrics to log file.
+    Queued for perf_writer() when it is running (dropped if the queue is full),
+    otherwise written directly.
+    """
+    if not _perf_writer_running:
+        _write_perf_batch([entry])
+        return
+    try:
+        _PERF_QUEUE.put_nowait(entry)
+    except asyncio.QueueFull:
+        logger.warning("Perf log queue full, dropping entry")
+
+
+async def perf_writer(delay: float = PERF_BATCH_DELAY_SECONDS) -> None:
+    """Background task: write queued perf entries in batches, off the event loop."""
+    global _perf_writer_running
+    _perf_writer_running = True
+    try:
+        while True:
+            batch = [await _PERF_QUEUE.get()]
+            try:
+                # Give a burst of requests a moment to pile into the same batch
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                _write_perf_batch(batch + _drain_perf_queue())
+                raise
+            batch.extend(_drain_perf_queue())
+            await asyncio.to_thread(_write_perf_batch, batch)
+    finally:
+        _perf_writer_running = False
+
+
+async def flush_perf_queue() -> None:
+    """Write whatever is still queued (used on shutdown)."""
+    batch = _drain_perf_queue()
+    if batch:
+        await asyncio.to_thread(_write_perf_batch, batch)
+
+
+def _tail_lines(path: Path, limit: int) -> List[bytes]:
+    """
+    Last `limit` non-empty lines of a file, reading backwards from the end
+    in chunks instead of loading the whole (append-only, ever-growing) log.
+    """
+    with path.open("rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size <= _PERF_TAIL_FULL_READ_BYTES:
+            f.seek(0)
+            data = f.read()
+        else:
+            data = b""
+            pos = size
+            # One extra newline so the (possibly partial) first line can be dropped
+            while pos > 0 and data.count(b"\n") <= limit:
+                step = min(_PERF_TAIL_CHUNK_BYTES, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+
+    # Raw bytes lines: orjson parses them directly, and a torn multi-byte char
+    # at the chunk boundary can only affect the dropped first line
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    return lines[-limit:]
+
+
 def read_perf_entries(limit: int = 20) -> List[Dict]:
     """Read the last N performance log entries."""
     if limit < 1:
@@ -57,12 +240,11 @@ def read_perf_entries(limit: int = 20) -> List[Dict]:
     if not PERF_LOG_PATH.exists():
         return []
 
-    lines = PERF_LOG_PATH.read_text(encoding="utf-8").splitlines()
-    tail = lines[-limit:]
+    tail = _tail_lines(PERF_LOG_PATH, limit)
     items = []
     for line in tail:
         try:
-            items.append(json.loads(line))
-        except Exception:
+            items.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
             continue
     return items
@@ -0,0 +1,91 @@
+"""
+Lightweight CORS middleware for a small, static origin allow-list.
+
+Starlette's CORSMiddleware is generic (wildcards, regexes, per-request header
+dicts). Our allow-list is fixed at startup, so origins are kept in a frozenset
+and every header we emit is precomputed as raw bytes.
+"""
+
+from typing import Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ALLOW_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+
+class StaticCORSMiddleware:
+    """
+    Raw ASGI CORS middleware equivalent to
+    CORSMiddleware(allow_origins=..., allow_credentials=True,
+                   allow_methods=["*"], allow_headers=["*"]).
+    """
+
+    def __init__(self, app: ASGIApp, allow_origins: Iterable[str], max_age: int = 600) -> None:
+        self.app = app
+        self._allowed = frozenset(o.encode("latin-1") for o in allow_origins)
+
+        self._simple_headers = (
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        )
+        self._preflight_headers = (
+            (b"access-control-allow-methods", ALLOW_METHODS),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"vary", b"Origin"),
+            (b"content-type", b"text/plain; charset=utf-8"),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value
+            elif key == b"access-control-request-method":
+                request_method = value
+            elif key == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(origin, request_headers, send)
+            return
+
+        if origin not in self._allowed:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"access-control-allow-origin", origin))
+                headers.extend(self._simple_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, origin: bytes, request_headers: bytes | None, send: Send) -> None:
+        """Answer a CORS preflight without touching the routing stack."""
+        if origin in self._allowed:
+            status, body = 200, b"OK"
+            headers = [(b"access-control-allow-origin", origin), *self._preflight_headers]
+            if request_headers:
+                # allow_headers=["*"] with credentials means echoing what was asked for.
+                headers.append((b"access-control-allow-headers", request_headers))
+        else:
+            status, body = 400, b"Disallowed CORS origin"
+            headers = list(self._preflight_headers)
+
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
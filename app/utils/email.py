@@ -3,8 +3,12 @@ Email utilities module - handles sending email notifications.
 """
 
 import os
-import resend
+import atexit
 import logging
+import threading
+from typing import Optional
+
+import requests
 from dotenv import load_dotenv
 
 
@@ -12,7 +16,42 @@ from dotenv import load_dotenv
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-resend.api_key = os.getenv("RESEND_API_KEY")
+RESEND_API_URL = "https://api.resend.com/emails"
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+
+# Read once at import; environment doesn't change while the process runs.
+TO_EMAIL = os.environ.get("TO_EMAIL")
+FROM_USER = os.environ.get("FROM_USER")
+
+# Constant part of every send; only recipient/subject/body change per call.
+_EMAIL_TEMPLATE = {"from": FROM_USER}
+
+# One keep-alive HTTPS session per process, so repeated sends skip TCP/TLS setup.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Get the shared Resend session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {RESEND_API_KEY}"})
+            _session = session
+        return _session
+
+
+def close_email_session() -> None:
+    """Close the shared Resend session (app shutdown / interpreter exit)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+atexit.register(close_email_session)
 
 
 def send_email(subject: str, body: str, to_email: str | None = None) -> bool:
@@ -21,20 +60,16 @@ def send_email(subject: str, body: str, to_email: str | None = None) -> bool:
     """
 
     # provided only for registered ussers.
-    to_addr = to_email or os.environ.get("TO_EMAIL")
-    from_addr = os.environ.get("FROM_USER")
+    to_addr = to_email or TO_EMAIL
+    from_addr = FROM_USER
 
-    if not all([to_addr, from_addr]):
+    if not all([to_addr, from_addr, RESEND_API_KEY]):
         logger.error("Email addresses not configured properly.")
         return False
     try:
-        params = {
-            "from": from_addr,
-            "to": to_addr,
-            "subject": subject,
-            "html": body
-        }
-        resend.Emails.send(params)
+        params = dict(_EMAIL_TEMPLATE, to=to_addr, subject=subject, html=body)
+        resp = _get_session().post(RESEND_API_URL, json=params, timeout=15)
+        resp.raise_for_status()
         return True
     except Exception as e:
         logger.error(f"Failed to send email: {e}")
@@ -0,0 +1,80 @@
+"""
+In-memory cache for the static web frontend.
+
+Small assets are read once per worker with a precomputed ETag and MIME type,
+so serving them is a dict lookup. Larger files keep their stat result and are
+streamed from disk.
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_BYTES = 256 * 1024
+
+# rel_path -> (body, etag, content_type)
+STATIC_CACHE: Dict[str, Tuple[bytes, str, str]] = {}
+# rel_path -> (path, stat_result) for files too large to keep in memory
+STATIC_LARGE: Dict[str, Tuple[Path, os.stat_result]] = {}
+
+
+def load_static_cache(root: Path) -> None:
+    """Scan `root` once and populate STATIC_CACHE / STATIC_LARGE."""
+    STATIC_CACHE.clear()
+    STATIC_LARGE.clear()
+    if not root.exists():
+        return
+
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            rel = path.relative_to(root).as_posix()
+            stat = path.stat()
+            if stat.st_size > MAX_CACHED_BYTES:
+                STATIC_LARGE[rel] = (path, stat)
+                continue
+
+            body = path.read_bytes()
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            STATIC_CACHE[rel] = (body, etag, content_type)
+
+    logger.info(f"Static cache: {len(STATIC_CACHE)} in memory, {len(STATIC_LARGE)} on disk")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check: a list of (possibly weak, W/-prefixed) ETags, or "*"."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def serve_static(rel_path: str, request: Request) -> Response:
+    """Serve a web asset from the cache (index.html for directory paths)."""
+    rel = rel_path.lstrip("/")
+    if not rel or rel.endswith("/"):
+        rel += "index.html"
+
+    entry = STATIC_CACHE.get(rel)
+    if entry is not None:
+        body, etag, content_type = entry
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers={"etag": etag})
+        return Response(content=body, media_type=content_type, headers={"etag": etag})
+
+    large = STATIC_LARGE.get(rel)
+    if large is not None:
+        path, stat = large
+        return FileResponse(path, stat_result=stat)
+
+    raise HTTPException(status_code=404, detail="Not Found")
@@ -3,16 +3,34 @@ Supabase client utilities with connection handling.
 """
 
 import os
+import json
+import base64
 import logging
 from functools import lru_cache
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
 from supabase import create_client, Client
 
+load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Read once at import; environment doesn't change while the process runs.
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "").strip()
+SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY", "").strip()
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "").strip()
+
+if not SUPABASE_URL:
+    logger.warning("SUPABASE_URL not configured - Supabase-backed endpoints will fail")
+
 # Don't cache clients to avoid SSL connection issues
 _admin_client: Client = None
 _anon_client: Client = None
 
+# Shared async client for direct PostgREST calls (one pool per worker)
+_async_http: Optional[httpx.AsyncClient] = None
+
 
 def get_supabase(admin: bool = False) -> Client:
     """
@@ -22,22 +40,18 @@ def get_supabase(admin: bool = False) -> Client:
     """
     global _admin_client, _anon_client
     
-    url = os.environ.get("SUPABASE_URL", "").strip()
-    
-    if not url:
+    if not SUPABASE_URL:
         raise ValueError("SUPABASE_URL not configured")
     
     if admin:
-        key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "").strip()
-        if not key:
+        if not SUPABASE_SERVICE_ROLE_KEY:
             raise ValueError("SUPABASE_SERVICE_ROLE_KEY not configured")
         # Create fresh client each time to avoid SSL issues
-        return create_client(url, key)
+        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
     else:
-        key = os.environ.get("SUPABASE_ANON_KEY", "").strip()
-        if not key:
+        if not SUPABASE_ANON_KEY:
             raise ValueError("SUPABASE_ANON_KEY not configured")
-        return create_client(url, key)
+        return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
 
 def get_supabase_with_retry(admin: bool = False, retries: int = 3) -> Client:
@@ -54,4 +68,65 @@ def get_supabase_with_retry(admin: bool = False, retries: int = 3) -> Client:
                 time.sleep(0.5 * (attempt + 1))
                 logger.warning(f"Supabase connection retry {attempt + 1}/{retries}: {e}")
     
-    raise last_error
\ No newline at end of file
+    raise last_error
+
+
+def decode_jwt_claims(token: str) -> dict:
+    """
+    Decode a JWT payload WITHOUT verifying its signature.
+    Only use on tokens Supabase has already accepted (auth.get_user).
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return claims if isinstance(claims, dict) else {}
+    except Exception:
+        return {}
+
+
+def get_async_http() -> httpx.AsyncClient:
+    """
+    Get the shared httpx.AsyncClient used for async PostgREST calls.
+    Created lazily inside the worker's event loop and reused across requests.
+    HTTP/2 multiplexes concurrent usage/subscription reads onto one connection.
+    """
+    global _async_http
+    if _async_http is None or _async_http.is_closed:
+        _async_http = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=20,
+                keepalive_expiry=60,
+            ),
+        )
+    return _async_http
+
+
+async def close_async_http() -> None:
+    """Close the shared async client (called on app shutdown)."""
+    global _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+        _async_http = None
+
+
+def rest_url(table: str) -> str:
+    """PostgREST endpoint for a table."""
+    if not SUPABASE_URL:
+        raise ValueError("SUPABASE_URL not configured")
+    return f"{SUPABASE_URL.rstrip('/')}/rest/v1/{table}"
+
+
+def rest_headers(admin: bool = True) -> dict:
+    """
+    Auth headers for direct PostgREST calls.
+    admin=True uses service role key (bypasses RLS).
+    """
+    key = SUPABASE_SERVICE_ROLE_KEY if admin else SUPABASE_ANON_KEY
+    if not key:
+        env_name = "SUPABASE_SERVICE_ROLE_KEY" if admin else "SUPABASE_ANON_KEY"
+        raise ValueError(f"{env_name} not configured")
+    return {"apikey": key, "Authorization": f"Bearer {key}"}
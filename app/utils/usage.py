@@ -4,40 +4,56 @@ Free: 3 generations/day
 Paid: unlimited
 """
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
+import asyncio
 import logging
 import time
 
+import httpx
+
 logger = logging.getLogger(__name__)
 
 # adjust to 3 later.
 FREE_DAILY_LIMIT = 3
 
+# (epoch_day, "YYYY-MM-DD") - only re-run strftime when the UTC day rolls over.
+_TODAY_CACHE: Tuple[int, str] = (-1, "")
+
+# Deferred usage writes: user_id -> (date, daily_generations to persist).
+# Drained by usage_flusher(); only counts past the free allowance land here.
+_PENDING_USAGE: Dict[str, Tuple[str, int]] = {}
+USAGE_FLUSH_INTERVAL_SECONDS = 2.0
+
 
 def _today_key() -> str:
     """Get today's date as a string key."""
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    global _TODAY_CACHE
+    day = int(time.time() // 86400)
+    if _TODAY_CACHE[0] != day:
+        _TODAY_CACHE = (day, datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+    return _TODAY_CACHE[1]
 
 
-def _get_admin_client():
-    """Get admin client with import to avoid circular imports."""
-    from app.utils.supabase import get_supabase
-    return get_supabase(admin=True)
+def _rest():
+    """Get async PostgREST helpers with import to avoid circular imports."""
+    from app.utils import supabase
+    return supabase
 
 
-def _safe_query(query_fn, default=None, retries=2):
-    """Execute a query with retry logic for transient SSL errors."""
+async def _safe_query(query_fn, default=None, retries=2):
+    """Execute an async query with retry logic for transient SSL errors."""
     last_error = None
     for attempt in range(retries):
         try:
-            return query_fn()
+            return await query_fn()
         except Exception as e:
             last_error = e
             error_str = str(e).lower()
             # Retry on SSL/connection errors
-            if 'ssl' in error_str or 'connection' in error_str or 'timeout' in error_str:
+            if (isinstance(e, httpx.TransportError) or
+                    'ssl' in error_str or 'connection' in error_str or 'timeout' in error_str):
                 if attempt < retries - 1:
-                    time.sleep(0.3 * (attempt + 1))
+                    await asyncio.sleep(0.3 * (attempt + 1))
                     logger.warning(f"Retrying query (attempt {attempt + 2}/{retries}): {e}")
                     continue
             # Non-retryable error
@@ -47,56 +63,81 @@ def _safe_query(query_fn, default=None, retries=2):
     return default
 
 
-def get_user_usage(user_id: str) -> dict:
+async def _select_user_row(table: str, user_id: str) -> dict:
+    """Fetch the row for user_id from a table via PostgREST."""
+    rest = _rest()
+    resp = await rest.get_async_http().get(
+        rest.rest_url(table),
+        params={"select": "*", "user_id": f"eq.{user_id}"},
+        headers=rest.rest_headers(admin=True),
+    )
+    resp.raise_for_status()
+    rows = resp.json()
+    if rows and len(rows) > 0:
+        return rows[0]
+    return {}
+
+
+async def get_user_usage(user_id: str) -> dict:
     """Get user's usage data from Supabase."""
-    def query():
-        admin = _get_admin_client()
-        result = admin.table("user_usage").select("*").eq("user_id", user_id).execute()
-        if result.data and len(result.data) > 0:
-            return result.data[0]
-        return {}
-    
-    return _safe_query(query, default={})
+    return await _safe_query(lambda: _select_user_row("user_usage", user_id), default={})
 
 
-def get_user_subscription(user_id: str) -> dict:
+async def get_user_subscription(user_id: str) -> dict:
     """Get user's subscription status from Supabase."""
-    def query():
-        admin = _get_admin_client()
-        result = admin.table("subscriptions").select("*").eq("user_id", user_id).execute()
-        if result.data and len(result.data) > 0:
-            return result.data[0]
-        return {}
-    
-    return _safe_query(query, default={})
+    return await _safe_query(lambda: _select_user_row("subscriptions", user_id), default={})
+
 
+def _claims_show_active(claims: Optional[dict]) -> bool:
+    """
+    True if verified JWT claims carry an unexpired active subscription.
+    The payments webhook mirrors status into app_metadata.sub_status.
+    """
+    if not claims:
+        return False
+    status = claims.get("sub_status") or (claims.get("app_metadata") or {}).get("sub_status")
+    return status == "active" and (claims.get("exp") or 0) > time.time()
 
-def is_user_paid(user_id: str) -> bool:
-    """Check if user has an active paid subscription."""
-    sub = get_user_subscription(user_id)
+
+async def is_user_paid(user_id: str, claims: Optional[dict] = None) -> bool:
+    """
+    Check if user has an active paid subscription.
+    An active claim in the user's token skips the DB; anything else falls back to it.
+    """
+    if _claims_show_active(claims):
+        return True
+    sub = await get_user_subscription(user_id)
     return sub.get("status") == "active"
 
 
-def get_daily_generations(user_id: str) -> int:
+def _pending_count(user_id: str, today: str) -> int:
+    """Today's not-yet-flushed count for a user (0 if none)."""
+    pending = _PENDING_USAGE.get(user_id)
+    if pending and pending[0] == today:
+        return pending[1]
+    return 0
+
+
+async def get_daily_generations(user_id: str) -> int:
     """Get how many generations user has used today."""
-    usage = get_user_usage(user_id)
+    usage = await get_user_usage(user_id)
     today = _today_key()
     
     if usage.get("last_generation_date") != today:
-        return 0
+        return _pending_count(user_id, today)
     
-    return usage.get("daily_generations", 0)
+    return max(usage.get("daily_generations", 0), _pending_count(user_id, today))
 
 
-def can_generate(user_id: str) -> Tuple[bool, int, str]:
+async def can_generate(user_id: str, claims: Optional[dict] = None) -> Tuple[bool, int, str]:
     """
     Check if user can generate.
     Returns: (can_generate, remaining, reason)
     """
-    if is_user_paid(user_id):
+    if await is_user_paid(user_id, claims):
         return True, -1, "unlimited"  # -1 means unlimited
     
-    used = get_daily_generations(user_id)
+    used = await get_daily_generations(user_id)
     remaining = FREE_DAILY_LIMIT - used
     
     if remaining > 0:
@@ -105,38 +146,84 @@ def can_generate(user_id: str) -> Tuple[bool, int, str]:
     return False, 0, "limit_reached"
 
 
-def increment_usage(user_id: str) -> int:
+async def _write_usage(user_id: str, day: str, count: int) -> int:
+    """Upsert a user's daily generation count."""
+    rest = _rest()
+    resp = await rest.get_async_http().post(
+        rest.rest_url("user_usage"),
+        params={"on_conflict": "user_id"},
+        json={
+            "user_id": user_id,
+            "daily_generations": count,
+            "last_generation_date": day,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        },
+        headers={
+            **rest.rest_headers(admin=True),
+            "Prefer": "resolution=merge-duplicates,return=minimal",
+        },
+    )
+    resp.raise_for_status()
+    return count
+
+
+async def increment_usage(user_id: str) -> int:
     """
     Increment user's daily generation count.
     Returns new count.
+
+    Counts up to FREE_DAILY_LIMIT gate the paywall, so they are written
+    through (other workers must see them). Beyond that only paid users
+    generate, and their writes are coalesced and flushed by usage_flusher().
     """
     today = _today_key()
-    usage = get_user_usage(user_id)
+    usage = await get_user_usage(user_id)
     
     # Reset if new day
     if usage.get("last_generation_date") != today:
-        new_count = 1
+        current = 0
     else:
-        new_count = usage.get("daily_generations", 0) + 1
-    
-    def update():
-        admin = _get_admin_client()
-        admin.table("user_usage").upsert(
-            {
-                "user_id": user_id,
-                "daily_generations": new_count,
-                "last_generation_date": today,
-                "updated_at": datetime.now(timezone.utc).isoformat(),
-            },
-            on_conflict="user_id",
-        ).execute()
+        current = usage.get("daily_generations", 0)
+    new_count = max(current, _pending_count(user_id, today)) + 1
+
+    if new_count > FREE_DAILY_LIMIT:
+        _PENDING_USAGE[user_id] = (today, new_count)
         return new_count
-    
-    result = _safe_query(update, default=new_count)
+
+    _PENDING_USAGE.pop(user_id, None)
+    result = await _safe_query(lambda: _write_usage(user_id, today, new_count), default=new_count)
     return result if result is not None else new_count
 
 
-def get_usage_status(user_id: Optional[str]) -> dict:
+async def flush_pending_usage() -> None:
+    """Persist all deferred usage counts."""
+    global _PENDING_USAGE
+    if not _PENDING_USAGE:
+        return
+
+    # Swap before awaiting so increments during the flush queue up for the next round.
+    pending, _PENDING_USAGE = _PENDING_USAGE, {}
+
+    async def write(user_id: str, day: str, count: int) -> None:
+        ok = await _safe_query(lambda: _write_usage(user_id, day, count))
+        if ok is None:
+            # Keep it for the next flush unless a newer count arrived meanwhile.
+            _PENDING_USAGE.setdefault(user_id, (day, count))
+
+    await asyncio.gather(*(write(uid, day, count) for uid, (day, count) in pending.items()))
+
+
+async def usage_flusher(interval: float = USAGE_FLUSH_INTERVAL_SECONDS) -> None:
+    """Background task: flush deferred usage writes every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_pending_usage()
+        except Exception as e:
+            logger.warning(f"Usage flush failed: {e}")
+
+
+async def get_usage_status(user_id: Optional[str], claims: Optional[dict] = None) -> dict:
     """Get full usage status for a user."""
     if not user_id:
         return {
@@ -147,8 +234,8 @@ def get_usage_status(user_id: Optional[str]) -> dict:
             "can_generate": True,
         }
     
-    is_paid = is_user_paid(user_id)
-    used = get_daily_generations(user_id)
+    # Both lookups are independent - one round-trip of wall time instead of two.
+    is_paid, used = await asyncio.gather(is_user_paid(user_id, claims), get_daily_generations(user_id))
     
     if is_paid:
         return {
@@ -14,58 +14,113 @@ Usage:
         python -m scripts.tweet_scraper
 """
 
+import io
 import os
-import json
 import re
-from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 from xml.etree import ElementTree as ET
 
+import orjson
+
 # Output path
 CONFIG_DIR = Path(__file__).parent.parent / "config"
 OUTPUT_PATH = CONFIG_DIR / "style_profile.json"
+# feed URL -> {etag, last_modified, max_items, metrics}; metrics only, never tweet text.
+# Runtime state, so it lives in data/ (untracked) rather than config/
+DATA_DIR = Path(__file__).parent.parent / "data"
+RSS_CACHE_PATH = DATA_DIR / "rss_cache.json"
+# Bump when text_metrics() output changes so cached per-feed metrics are recomputed
+METRICS_VERSION = 2
 
 # Regex patterns
-URL_RE = re.compile(r"https?://\S+")
-WS_RE = re.compile(r"\s+")
+# URLs (with any whitespace before them) are dropped, other whitespace runs collapse
+# to one space - one scan instead of a URL pass followed by a whitespace pass.
+CLEAN_RE = re.compile(r"(\s*https?://\S+)|\s+")
 SENT_SPLIT_RE = re.compile(r"[.!?]+")
+CONTRAST_RE = re.compile(r" (?:but|however|instead|rather) ")
+
+DASH_CHARS = frozenset("\u2014-")  # em dash, hyphen
+QUOTE_CHARS = frozenset("\"'\u201c\u201d")  # straight and curly double quotes, apostrophe
+
+# Order of the values returned by text_metrics(); aggregate() reads them as columns.
+METRIC_FIELDS = (
+    "char_len", "word_count", "sentence_count",
+    "has_question", "has_colon", "has_dash", "has_quotes",
+    "starts_with_but", "contains_contrast",
+)
+
+
+def _clean_repl(m: re.Match) -> str:
+    return "" if m.group(1) else " "
 
 
 def clean_text(text: str) -> str:
     """Remove URLs and normalize whitespace."""
-    text = URL_RE.sub("", text)
-    text = WS_RE.sub(" ", text).strip()
-    return text
-
-
-def fetch_rss(rss_url: str, timeout: int = 30) -> str:
-    """Fetch RSS feed content."""
-    req = Request(
-        url=rss_url,
-        headers={
-            "User-Agent": "Mozilla/5.0 (compatible; banger-style-profiler/1.0)",
-            "Accept": "application/rss+xml, application/xml;q=0.9, */*;q=0.8",
-        },
-        method="GET",
-    )
-    with urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", errors="replace")
+    return CLEAN_RE.sub(_clean_repl, text).strip()
 
 
-def parse_rss_items(xml_text: str, max_items: int) -> list[str]:
+def fetch_rss(
+    rss_url: str,
+    timeout: int = 30,
+    etag: str | None = None,
+    last_modified: str | None = None,
+) -> tuple[bytes | None, str | None, str | None]:
+    """
+    Fetch raw RSS feed bytes (the XML parser handles the declared encoding).
+
+    Sends If-None-Match / If-Modified-Since when validators from a previous
+    run are given. Returns (body, etag, last_modified); body is None when the
+    server answers 304 Not Modified.
+    """
+    headers = {
+        "User-Agent": "Mozilla/5.0 (compatible; banger-style-profiler/1.0)",
+        "Accept": "application/rss+xml, application/xml;q=0.9, */*;q=0.8",
+    }
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    req = Request(url=rss_url, headers=headers, method="GET")
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            return resp.read(), resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    except HTTPError as e:
+        if e.code == 304:
+            return None, etag, last_modified
+        raise
+
+
+def load_rss_cache() -> dict:
+    """Load per-feed validators and metrics from the previous run."""
+    try:
+        return orjson.loads(RSS_CACHE_PATH.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+
+def parse_rss_items(xml_bytes: bytes, max_items: int) -> list[str]:
     """
     Returns a list of item titles (tweet text usually appears in <title> for Nitter RSS).
     We will immediately transform to metrics and never persist these strings.
-    """
-    root = ET.fromstring(xml_text)
-    channel = root.find("channel")
-    if channel is None:
-        return []
 
+    Items are streamed with iterparse and cleared once read, and parsing stops
+    as soon as max_items titles are collected.
+    """
     titles: list[str] = []
-    for item in channel.findall("item"):
-        title = (item.findtext("title") or "").strip()
+    if max_items <= 0:
+        return titles
+
+    for _, elem in ET.iterparse(io.BytesIO(xml_bytes), events=("end",)):
+        if elem.tag != "item":
+            continue
+        title = (elem.findtext("title") or "").strip()
+        elem.clear()
         if not title:
             continue
         titles.append(title)
@@ -75,75 +130,86 @@ def parse_rss_items(xml_text: str, max_items: int) -> list[str]:
     return titles
 
 
-def percentile(sorted_vals: list[int], p: float) -> int:
-    """Calculate percentile value from sorted list."""
-    if not sorted_vals:
-        return 0
-    idx = int(round((len(sorted_vals) - 1) * p))
-    return sorted_vals[max(0, min(idx, len(sorted_vals) - 1))]
+QUARTILES = (("p25", 0.25), ("p50", 0.50), ("p75", 0.75))
 
 
-def text_metrics(text: str) -> dict:
-    """Extract style metrics from text."""
+def quartiles(values: tuple[int, ...]) -> dict[str, int]:
+    """
+    p25/p50/p75 (nearest rank) of an integer column without sorting it.
+
+    Metric values are small integers with few distinct values, so counting
+    them and walking the distinct values once selects all three ranks.
+    """
+    n = len(values)
+    if not n:
+        return {name: 0 for name, _ in QUARTILES}
+
+    ranks = [(name, int(round((n - 1) * p))) for name, p in QUARTILES]
+    out: dict[str, int] = {}
+    seen = 0
+    i = 0
+    for value, count in sorted(Counter(values).items()):
+        seen += count
+        while i < len(ranks) and ranks[i][1] < seen:
+            out[ranks[i][0]] = value
+            i += 1
+        if i == len(ranks):
+            break
+    return out
+
+
+def text_metrics(text: str) -> tuple:
+    """Extract style metrics from text, as a tuple in METRIC_FIELDS order."""
     t = clean_text(text)
 
+    lowered = t.lower()
+
     char_len = len(t)
-    words = [w for w in t.split(" ") if w]
-    word_count = len(words)
-
-    # Rough sentence count
-    sentences = [s.strip() for s in SENT_SPLIT_RE.split(t) if s.strip()]
-    sentence_count = max(1, len(sentences)) if t else 0
-
-    has_question = "?" in t
-    has_colon = ":" in t
-    has_dash = "—" in t or "-" in t
-    has_quotes = '"' in t or """ in t or """ in t or "'" in t
-    starts_with_but = t.lower().startswith("but ")
-    contains_contrast = any(x in t.lower() for x in (" but ", " however ", " instead ", " rather "))
-
-    return {
-        "char_len": char_len,
-        "word_count": word_count,
-        "sentence_count": sentence_count,
-        "has_question": has_question,
-        "has_colon": has_colon,
-        "has_dash": has_dash,
-        "has_quotes": has_quotes,
-        "starts_with_but": starts_with_but,
-        "contains_contrast": contains_contrast,
-    }
+    # clean_text() leaves single spaces between words, so split() needs no filtering
+    word_count = len(t.split())
+
+    # Rough sentence count (count non-blank chunks without building a list)
+    sentences = sum(1 for s in SENT_SPLIT_RE.split(t) if s and not s.isspace())
+    sentence_count = max(1, sentences) if t else 0
+
+    # One pass to collect the distinct characters, then O(1) flag lookups
+    chars = set(t)
+    has_question = "?" in chars
+    has_colon = ":" in chars
+    has_dash = not chars.isdisjoint(DASH_CHARS)
+    has_quotes = not chars.isdisjoint(QUOTE_CHARS)
+    starts_with_but = lowered.startswith("but ")
+    contains_contrast = CONTRAST_RE.search(lowered) is not None
+
+    return (
+        char_len,
+        word_count,
+        sentence_count,
+        has_question,
+        has_colon,
+        has_dash,
+        has_quotes,
+        starts_with_but,
+        contains_contrast,
+    )
 
 
-def aggregate(metrics: list[dict]) -> dict:
-    """Aggregate metrics into a style profile."""
+def aggregate(metrics: list[tuple]) -> dict:
+    """Aggregate metrics (rows from text_metrics) into a style profile."""
     if not metrics:
         return {"count": 0}
 
-    chars = sorted(m["char_len"] for m in metrics)
-    words = sorted(m["word_count"] for m in metrics)
-    sentences = sorted(m["sentence_count"] for m in metrics)
+    # Transpose rows into columns once; every stat below is a single pass over one column
+    columns = dict(zip(METRIC_FIELDS, zip(*metrics)))
 
     def rate(key: str) -> float:
-        return sum(1 for m in metrics if m.get(key)) / len(metrics)
+        return sum(columns[key]) / len(metrics)
 
     profile = {
         "count": len(metrics),
-        "char_len": {
-            "p25": percentile(chars, 0.25),
-            "p50": percentile(chars, 0.50),
-            "p75": percentile(chars, 0.75),
-        },
-        "word_count": {
-            "p25": percentile(words, 0.25),
-            "p50": percentile(words, 0.50),
-            "p75": percentile(words, 0.75),
-        },
-        "sentence_count": {
-            "p25": percentile(sentences, 0.25),
-            "p50": percentile(sentences, 0.50),
-            "p75": percentile(sentences, 0.75),
-        },
+        "char_len": quartiles(columns["char_len"]),
+        "word_count": quartiles(columns["word_count"]),
+        "sentence_count": quartiles(columns["sentence_count"]),
         "rates": {
             "question": round(rate("has_question"), 3),
             "colon": round(rate("has_colon"), 3),
@@ -179,39 +245,75 @@ def main():
     if not usernames:
         raise RuntimeError("TARGET_USERS is empty. Provide comma-separated usernames.")
 
-    all_metrics: list[dict] = []
+    all_metrics: list[tuple] = []
     per_user_counts: dict[str, int] = {}
-
-    for username in usernames:
-        print(f"Fetching tweets for @{username}...")
-        rss_url = f"{nitter_base}/{username}/rss"
-        xml_text = fetch_rss(rss_url)
-        titles = parse_rss_items(xml_text, max_items=per_user)
-
-        # Convert to metrics and discard text
-        count_added = 0
-        for title in titles:
-            m = text_metrics(title)
-            if m["char_len"] < 40:
-                continue
-            all_metrics.append(m)
-            count_added += 1
-
-        per_user_counts[username] = count_added
-        print(f"  Added {count_added} tweets from @{username}")
+    rss_cache = load_rss_cache()
+    new_cache: dict[str, dict] = {}
+
+    # Feeds are independent and I/O-bound: fetch them concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(usernames))) as pool:
+        futures = {}
+        for username in usernames:
+            print(f"Fetching tweets for @{username}...")
+            rss_url = f"{nitter_base}/{username}/rss"
+            cached = rss_cache.get(rss_url)
+            # Cached metrics are only reusable if they were cut at the same max_items
+            # by the same version of text_metrics()
+            if cached and cached.get("max_items") == per_user and cached.get("version") == METRICS_VERSION:
+                fut = pool.submit(fetch_rss, rss_url, etag=cached.get("etag"), last_modified=cached.get("last_modified"))
+            else:
+                cached = None
+                fut = pool.submit(fetch_rss, rss_url)
+            futures[fut] = (username, rss_url, cached)
+
+        for fut in as_completed(futures):
+            username, rss_url, cached = futures[fut]
+            xml_bytes, etag, last_modified = fut.result()
+
+            if xml_bytes is None:
+                # 304: feed unchanged since last run, reuse its metrics
+                user_metrics = [tuple(m) for m in cached["metrics"]]
+                print(f"  Feed unchanged for @{username}, reusing {len(user_metrics)} cached tweets")
+            else:
+                titles = parse_rss_items(xml_bytes, max_items=per_user)
+
+                # Convert to metrics and discard text
+                user_metrics = []
+                for title in titles:
+                    m = text_metrics(title)
+                    if m[0] < 40:  # char_len
+                        continue
+                    user_metrics.append(m)
+                print(f"  Added {len(user_metrics)} tweets from @{username}")
+
+            all_metrics.extend(user_metrics)
+            per_user_counts[username] = len(user_metrics)
+            if etag or last_modified:
+                new_cache[rss_url] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "max_items": per_user,
+                    "version": METRICS_VERSION,
+                    "metrics": user_metrics,
+                }
+
+    # Keep the report in TARGET_USERS order regardless of completion order
+    per_user_counts = {u: per_user_counts[u] for u in usernames}
 
     profile = aggregate(all_metrics)
     profile["source"] = {
         "nitter_base": nitter_base,
         "usernames": usernames,
         "per_user_counts": per_user_counts,
-        "generated_at_utc": datetime.utcnow().isoformat() + "Z",
+        "generated_at_utc": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
     }
 
     # Ensure config directory exists
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
     
-    OUTPUT_PATH.write_text(json.dumps(profile, ensure_ascii=False, indent=2), encoding="utf-8")
+    OUTPUT_PATH.write_bytes(orjson.dumps(profile, option=orjson.OPT_INDENT_2))
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    RSS_CACHE_PATH.write_bytes(orjson.dumps(new_cache))
     print(f"\nSaved style profile -> {OUTPUT_PATH.resolve()}")
     print(f"Total counted items: {profile.get('count', 0)}")
 